@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+This script benchmarks back-translation throughput (sentences per second) on CPU for the
+batching modes of ```preprocessing.BackTranslation```. With --cpu-mode it also compares the
+int8 CPU inference mode against fp32 output (BLEU/chrF) on the same held-out sample.
+
+python benchmark.py Helsinki-NLP/opus-mt-es-en data/mono.es --rows 2000 --cpu-mode
+"""
+
+import argparse
+import sys
+import math
+import time
+import logging
+from collections import Counter
+
+import torch
+
+from preprocessing import BackTranslation, Pair, Translator
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(message)s', \
+                    handlers=[logging.StreamHandler(sys.stdout)])
+
+def throughput(function, batch, repeat=1) -> float:
+    """Returns the best sentences per second over repeated runs of function(batch)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(batch)
+        timings.append(time.perf_counter() - start)
+
+    return len(next(iter(batch.values()))) / min(timings)
+
+def ngrams(sequence, order) -> Counter:
+    """Counts of the n-grams of a sequence."""
+    return Counter(tuple(sequence[i:i + order]) for i in range(len(sequence) - order + 1))
+
+def corpus_bleu(hypotheses, references, max_order=4) -> float:
+    """Corpus BLEU (0-100) on whitespace tokens with a brevity penalty."""
+    matches, totals = [0] * max_order, [0] * max_order
+    hyp_length = ref_length = 0
+
+    for hypothesis, reference in zip(hypotheses, references):
+        hyp, ref = hypothesis.split(), reference.split()
+        hyp_length += len(hyp)
+        ref_length += len(ref)
+        for order in range(1, max_order + 1):
+            counts = ngrams(hyp, order)
+            matches[order - 1] += sum((counts & ngrams(ref, order)).values())
+            totals[order - 1] += sum(counts.values())
+
+    if min(matches) == 0:
+        return 0.0
+
+    precision = sum(math.log(m / t) for m, t in zip(matches, totals)) / max_order
+    penalty = min(0.0, 1 - ref_length / max(hyp_length, 1))
+    return 100 * math.exp(precision + penalty)
+
+def corpus_chrf(hypotheses, references, max_order=6, beta=2) -> float:
+    """Corpus chrF (0-100) on character n-grams without whitespace."""
+    matches, hyp_totals, ref_totals = [0] * max_order, [0] * max_order, [0] * max_order
+
+    for hypothesis, reference in zip(hypotheses, references):
+        hyp, ref = hypothesis.replace(' ', ''), reference.replace(' ', '')
+        for order in range(1, max_order + 1):
+            hyp_counts, ref_counts = ngrams(hyp, order), ngrams(ref, order)
+            matches[order - 1] += sum((hyp_counts & ref_counts).values())
+            hyp_totals[order - 1] += sum(hyp_counts.values())
+            ref_totals[order - 1] += sum(ref_counts.values())
+
+    precision = sum(m / t for m, t in zip(matches, hyp_totals) if t) / max_order
+    recall = sum(m / t for m, t in zip(matches, ref_totals) if t) / max_order
+    if precision + recall == 0:
+        return 0.0
+
+    return 100 * (1 + beta**2) * precision * recall / (beta**2 * precision + recall)
+
+def fixed_batches(backtranslation, batch_size):
+    """Today's path: padded batches of batch_size rows in file order."""
+    def run(batch):
+        rows = len(batch[backtranslation.target])
+        for start in range(0, rows, batch_size):
+            backtranslation.translate({backtranslation.target:
+                                       batch[backtranslation.target][start:start + batch_size]})
+    return run
+
+def token_budget(backtranslation, max_tokens):
+    """Length-sorted batches of at most max_tokens padded tokens."""
+    return lambda batch: backtranslation.translate(batch, max_tokens=max_tokens)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark back-translation on CPU.')
+    parser.add_argument('model', help='Marian model name or local path')
+    parser.add_argument('corpus', help='Monolingual corpus (text<TAB>idx)')
+    parser.add_argument('--prefix', default='', help='Task prefix')
+    parser.add_argument('--rows', type=int, default=2000, help='Rows to translate')
+    parser.add_argument('--batch-size', type=int, default=125, help='Rows per fixed batch')
+    parser.add_argument('--max-tokens', type=int, default=4000, help='Token budget per batch')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per mode')
+    parser.add_argument('--cpu-mode', action='store_true', help='Compare int8 CPU mode to fp32')
+    parser.add_argument('--threads', type=int, default=None, help='Intra-op threads')
+    args = parser.parse_args()
+
+    bt = BackTranslation(Translator(args.model, args.prefix), args.corpus, Pair('source', 'target'))
+    bt.translator.to(torch.device('cpu'))
+    bt.device = torch.device('cpu')
+    sample = bt.dataset[:args.rows]
+
+    modes = {
+        f'fixed (batch_size={args.batch_size})': fixed_batches(bt, args.batch_size),
+        f'token budget (max_tokens={args.max_tokens})': token_budget(bt, args.max_tokens),
+    }
+    for mode, function in modes.items():
+        logging.info("%s: %.1f sentences/s", mode, throughput(function, sample, args.repeat))
+
+    if args.cpu_mode:
+        fp32 = bt.translate(sample, max_tokens=args.max_tokens)[bt.source]
+
+        bt.optimize_for_cpu(threads=args.threads)
+        speed = throughput(token_budget(bt, args.max_tokens), sample, args.repeat)
+        int8 = bt.translate(sample, max_tokens=args.max_tokens)[bt.source]
+
+        logging.info("int8 token budget (max_tokens=%d): %.1f sentences/s", args.max_tokens, speed)
+        logging.info("int8 vs fp32: BLEU %.2f, chrF %.2f, identical %.1f%%",
+                     corpus_bleu(int8, fp32), corpus_chrf(int8, fp32),
+                     100 * sum(a == b for a, b in zip(int8, fp32)) / max(len(fp32), 1))
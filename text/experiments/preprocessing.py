@@ -7,17 +7,508 @@ This script aids in the preprocessing step for the pre-training data.
 - Used preprocessing techniques from section 3.1 Pre-Training Data from:
 https://aclanthology.org/2024.lrec-main.1283.pdf
 """
-from typing import NoReturn
+import os
+import csv
+import json
+import mmap
+import codecs
+import shutil
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import subprocess
+import multiprocessing
+import itertools
+import unicodedata
+from typing import Iterator, NoReturn
+from contextlib import nullcontext
+from collections import OrderedDict
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
 
 import ftfy
+import xxhash
+import numpy as np
 import pandas as pd
+import yaml
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 import torch
-from transformers import MarianMTModel, MarianTokenizer
-from datasets import load_dataset, Dataset, DatasetDict
+from transformers import AutoModel, AutoTokenizer, MarianMTModel, MarianTokenizer
+from huggingface_hub import CommitOperationAdd, CommitOperationDelete, HfApi
+from datasets import load_dataset
 
 OPEN_DATA = ['Tatoeba', 'OpenSubtitles', 'KDE4', 'wikimedia', 'GNOME']
 
+class LineIndex:
+    """
+    Memory-mapped view of a text file with an offset index over its lines.
+
+    Line i is ``buffer[offsets[i]:offsets[i + 1]]`` without its line terminator, so lookups
+    by line number never copy the rest of the corpus into memory.
+    """
+
+    def __init__(self, path, chunk_size=1 << 24):
+        self._file = open(path, 'rb') # pylint: disable=consider-using-with
+        size = os.fstat(self._file.fileno()).st_size
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+        start = len(codecs.BOM_UTF8) if self._buffer[:3] == codecs.BOM_UTF8 else 0
+        newlines = []
+        for pos in range(start, size, chunk_size):
+            block = np.frombuffer(self._buffer, dtype=np.uint8,
+                                  count=min(chunk_size, size - pos), offset=pos)
+            newlines.append(np.flatnonzero(block == 10) + pos + 1)
+            del block
+
+        offsets = np.concatenate([[start], *newlines]).astype(np.int64)
+        if offsets[-1] != size:
+            offsets = np.append(offsets, size)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index) -> bytes:
+        line = self._buffer[self.offsets[index]:self.offsets[index + 1]]
+        return line.rstrip(b'\r\n')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self) -> None:
+        """Release the memory map and the underlying file."""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _moses_line(text) -> str:
+    """Helper function to keep one segment per line in moses files."""
+    return text.replace('\r', ' ').replace('\n', ' ') + '\n'
+
+def _is_clean(text) -> bool:
+    """Helper function for text that ftfy is guaranteed to leave unchanged."""
+    return text.isascii() and text.isprintable() and '&' not in text
+
+def _fix_texts(texts) -> list[str]:
+    """Helper function for fixing encoding in a worker process."""
+    return [ftfy.fix_text(text) for text in texts]
+
+def _read_chunks(bitext_path, chunk_size):
+    """Helper function to stream a bitext .csv file as string-typed chunks."""
+    return pd.read_csv(bitext_path, dtype=str, keep_default_na=False,
+                       encoding='utf-8-sig', chunksize=chunk_size)
+
+def _rewrite_bitext(bitext_path, save_path, transform, chunk_size) -> None:
+    """
+    Helper function to stream a bitext through transform(chunk) into save_path.
+
+    Chunks are written to a temporary file first, so save_path may be bitext_path.
+    """
+    tmp_path = (save_path or bitext_path) + '.tmp'
+
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as file:
+        for i, chunk in enumerate(_read_chunks(bitext_path, chunk_size)):
+            transform(chunk).to_csv(file, header=i == 0, index=False)
+
+    os.replace(tmp_path, save_path or bitext_path)
+
+class FilterPipeline:
+    """
+    Composable row filters for a bitext.
+
+    Token and character counts for both sides are computed once per chunk as NumPy arrays
+    and every registered filter returns a boolean mask of rows to keep, so adding filters
+    never adds a pass over the corpus. Filters run as a cascade on the rows that are still
+    kept, cheap filters before expensive ones (e.g., alignment scoring).
+    """
+
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+        self.filters = {}
+        self.expensive = set()
+
+    def add(self, name, predicate, expensive=False) -> 'FilterPipeline':
+        """
+        Register a filter.
+
+        :param name: name used for the drop counts
+        :param predicate: function (stats, chunk) -> boolean array of rows to keep
+        :param expensive: run after every cheap filter
+        """
+        self.filters[name] = predicate
+        if expensive:
+            self.expensive.add(name)
+        return self
+
+    def stats(self, chunk) -> dict[str, np.ndarray]:
+        """Token and character counts for both sides of a chunk."""
+        stats = {}
+        for side, language in (('src', self.source), ('tgt', self.target)):
+            text = chunk[language].str
+            stats[f'{side}_tokens'] = text.count(r'\S+').to_numpy(dtype=np.int64)
+            stats[f'{side}_chars'] = text.len().to_numpy(dtype=np.int64)
+        return stats
+
+    def apply(self, chunk, counts) -> pd.DataFrame:
+        """
+        Filter a chunk and add the dropped rows per filter to counts.
+
+        Each filter only sees the rows kept by the filters before it.
+        """
+        keep = np.ones(len(chunk), dtype=bool)
+        stats = self.stats(chunk)
+
+        for name in sorted(self.filters, key=lambda name: name in self.expensive):
+            kept = np.flatnonzero(keep)
+            if len(kept) == 0:
+                break
+            mask = np.asarray(self.filters[name]({key: value[kept] for key, value in stats.items()},
+                                                 chunk.iloc[kept]), dtype=bool)
+            counts[name] = counts.get(name, 0) + int(np.count_nonzero(~mask))
+            keep[kept[~mask]] = False
+
+        counts['total'] = counts.get('total', 0) + int(np.count_nonzero(~keep))
+        return chunk[keep]
+
+    def run(self, bitext_path, save_path=None, chunk_size=100_000) -> dict[str, int]:
+        """
+        Stream a bitext through all filters in one pass.
+
+        A row is counted under the first filter that drops it, so the per-filter counts
+        add up to the total number of dropped rows.
+
+        :param bitext_path: bitext .csv file
+        :param save_path: output .csv file (defaults to rewriting bitext_path)
+        :param chunk_size: number of rows read per chunk
+        :return: number of dropped rows per filter and in total
+        """
+        counts = dict.fromkeys([*self.filters, 'total'], 0)
+        _rewrite_bitext(bitext_path, save_path, lambda chunk: self.apply(chunk, counts),
+                        chunk_size)
+        return counts
+
+
+class LaBSEEncoder:
+    """
+    Sentence encoder for a LaBSE-style model stored at a local path.
+
+    Any callable mapping a list of sentences to an (n, dim) array can be used instead.
+    """
+
+    def __init__(self, model_path, max_length=128):
+        self.model_path = model_path
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.model = AutoModel.from_pretrained(model_path).eval()
+        self.max_length = max_length
+
+    def __call__(self, texts) -> np.ndarray:
+        encoded = self.tokenizer(texts, max_length=self.max_length, truncation=True,
+                                 padding=True, return_tensors='pt')
+
+        with torch.inference_mode():
+            output = self.model(**encoded)
+
+        pooled = getattr(output, 'pooler_output', None)
+        if pooled is None:
+            pooled = output.last_hidden_state[:, 0]
+
+        return torch.nn.functional.normalize(pooled, dim=-1).numpy()
+
+class EmbeddingCache:
+    """
+    Memory-mapped float16 embedding store keyed by a 64-bit hash of the sentence.
+
+    Vectors live in embeddings.f16 and their keys, in row order, in keys.u64; both files
+    only grow, so a cache can be reused across runs and corpora of the same encoder, which
+    is recorded in meta.json. Lookups search a sorted copy of the keys (8 bytes per key
+    plus the row number) and a small dict of recently added keys that is merged into it
+    once it grows.
+    """
+
+    def __init__(self, path, encoder=None):
+        os.makedirs(path, exist_ok=True)
+        self.encoder = encoder
+        self._vectors_path = os.path.join(path, 'embeddings.f16')
+        self._keys_path = os.path.join(path, 'keys.u64')
+        self._meta_path = os.path.join(path, 'meta.json')
+
+        keys = np.fromfile(self._keys_path, dtype=np.uint64) \
+            if os.path.exists(self._keys_path) else np.empty(0, dtype=np.uint64)
+        self._rows = np.argsort(keys, kind='stable')
+        self._keys = keys[self._rows]
+        self._recent = {}
+        self.vectors = None
+        self.dim = None
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            if meta.get('encoder') != encoder:
+                raise ValueError(f"{path} caches embeddings of encoder {meta.get('encoder')!r}, "
+                                 f"not {encoder!r}; use another cache_path")
+            self.dim = meta['dim']
+            rows = os.path.getsize(self._vectors_path) // (2 * self.dim)
+            self.vectors = np.memmap(self._vectors_path, dtype=np.float16, mode='r+',
+                                     shape=(rows, self.dim))
+
+    @staticmethod
+    def key(text) -> int:
+        """Hash of a sentence."""
+        return xxhash.xxh3_64_intdigest(text)
+
+    def __len__(self):
+        return len(self._keys) + len(self._recent)
+
+    def _reserve(self, rows, dim) -> None:
+        """Helper function to grow the memory map to hold at least rows vectors."""
+        if self.vectors is None:
+            self.dim = dim
+            with open(self._meta_path, 'w', encoding='utf-8') as file:
+                json.dump({'dim': dim, 'encoder': self.encoder}, file)
+        elif rows <= len(self.vectors):
+            return
+        else:
+            self.vectors.flush()
+            rows = max(rows, 2 * len(self.vectors))
+            self.vectors = None
+
+        with open(self._vectors_path, 'ab') as file:
+            file.truncate(max(rows, 1024) * 2 * dim)
+        size = os.path.getsize(self._vectors_path) // (2 * dim)
+        self.vectors = np.memmap(self._vectors_path, dtype=np.float16, mode='r+',
+                                 shape=(size, dim))
+
+    def add(self, keys, vectors) -> None:
+        """Append vectors for new keys."""
+        start = len(self)
+        self._reserve(start + len(keys), vectors.shape[1])
+        self.vectors[start:start + len(keys)] = vectors.astype(np.float16)
+        self.vectors.flush()
+
+        with open(self._keys_path, 'ab') as file:
+            np.asarray(keys, dtype=np.uint64).tofile(file)
+        self._recent.update((key, start + i) for i, key in enumerate(keys))
+
+        if len(self._recent) >= max(1 << 16, len(self._keys) // 4):
+            keys = np.concatenate([self._keys, np.fromiter(self._recent, dtype=np.uint64)])
+            rows = np.concatenate([self._rows, np.fromiter(self._recent.values(), dtype=np.int64)])
+            order = np.argsort(keys, kind='stable')
+            self._keys, self._rows, self._recent = keys[order], rows[order], {}
+
+    def lookup(self, keys) -> np.ndarray:
+        """Row numbers of keys, -1 for keys missing from the cache."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+
+        if len(self._keys):
+            position = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+            found = self._keys[position] == keys
+            rows[found] = self._rows[position[found]]
+        if self._recent:
+            for i in np.flatnonzero(rows < 0):
+                rows[i] = self._recent.get(int(keys[i]), -1)
+
+        return rows
+
+class AlignmentScorer:
+    """
+    Cosine similarity between source and target sentence embeddings.
+
+    Only sentences missing from the cache are encoded, in batches sorted by length so
+    that padding stays small; scores are computed in vectorized blocks of rows. The cache
+    is tied to encoder_name, which defaults to the model_path of a LaBSEEncoder.
+    """
+
+    def __init__(self, encoder, cache_path, batch_size=64, block_size=8192, encoder_name=None):
+        self.encoder = encoder
+        self.cache = EmbeddingCache(cache_path,
+                                    encoder_name or getattr(encoder, 'model_path', None))
+        self.batch_size = batch_size
+        self.block_size = block_size
+
+    def embed(self, texts) -> np.ndarray:
+        """Cache embeddings for texts and return their row numbers in the cache."""
+        keys = [EmbeddingCache.key(text) for text in texts]
+
+        missing = {}
+        for key, text, row in zip(keys, texts, self.cache.lookup(keys)):
+            if row < 0:
+                missing[key] = text
+
+        pending = sorted(missing.items(), key=lambda item: len(item[1]))
+        for i in range(0, len(pending), self.batch_size):
+            batch = pending[i:i + self.batch_size]
+            vectors = np.asarray(self.encoder([text for _, text in batch]))
+            self.cache.add([key for key, _ in batch], vectors)
+
+        return self.cache.lookup(keys)
+
+    def score(self, sources, targets) -> np.ndarray:
+        """Cosine similarity for each (source, target) pair."""
+        src_rows = self.embed(list(sources))
+        tgt_rows = self.embed(list(targets))
+        scores = np.empty(len(src_rows), dtype=np.float32)
+
+        for start in range(0, len(scores), self.block_size):
+            block = slice(start, start + self.block_size)
+            src = np.asarray(self.cache.vectors[src_rows[block]], dtype=np.float32)
+            tgt = np.asarray(self.cache.vectors[tgt_rows[block]], dtype=np.float32)
+            norms = np.linalg.norm(src, axis=1) * np.linalg.norm(tgt, axis=1)
+            scores[block] = np.einsum('ij,ij->i', src, tgt) / np.maximum(norms, 1e-12)
+
+        return scores
+
+class HashSet:
+    """
+    Compact set of 64-bit hashes (8 bytes per hash) stored as sorted NumPy runs.
+
+    Runs are merged when a run is not at least twice as large as the next one, so there
+    are O(log n) runs to search and lookups are vectorized with np.searchsorted.
+    """
+
+    def __init__(self, path=None):
+        self.runs = []
+        if path is not None and os.path.exists(path):
+            run = np.load(path)
+            if len(run):
+                self.runs.append(run)
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, keys) -> np.ndarray:
+        """Membership mask for an array of keys."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        found = np.zeros(len(keys), dtype=bool)
+
+        for run in self.runs:
+            position = np.minimum(np.searchsorted(run, keys), len(run) - 1)
+            found |= run[position] == keys
+
+        return found
+
+    def add(self, keys) -> None:
+        """Add an array of keys."""
+        run = np.unique(np.asarray(keys, dtype=np.uint64))
+        if len(run) == 0:
+            return
+
+        self.runs.append(run)
+        while len(self.runs) > 1 and len(self.runs[-2]) < 2 * len(self.runs[-1]):
+            self.runs[-2:] = [np.union1d(self.runs[-2], self.runs[-1])]
+
+    def save(self, path) -> None:
+        """Save the set as a single sorted .npy array."""
+        keys = np.unique(np.concatenate(self.runs)) if self.runs else np.empty(0, np.uint64)
+        np.save(path, keys)
+
+class Deduplicator:
+    """
+    Streaming exact and near-duplicate detection for bitext pairs.
+
+    Exact duplicates are found through an xxh3-64 hash of the normalized pair. Near
+    duplicates use MinHash signatures over character n-grams with LSH banding: a pair
+    is a near duplicate when one of its bands was seen before, which happens with
+    probability 1 - (1 - s^r)^b for Jaccard similarity s, b bands and r rows per band.
+    Memory is bounded by the number of unique hashes, not by the corpus text.
+
+    Instances can be registered on a FilterPipeline; the first occurrence is kept. With
+    hashes_path, the hashes of earlier runs are loaded from that directory and save()
+    stores them there, so duplicates of an already processed corpus are removed too. The
+    band hashes are stored per MinHash setting.
+    """
+
+    def __init__(self, source, target, near_duplicates=True, num_perm=64, bands=8, ngram=3,
+                 seed=0, hashes_path=None):
+        self.source = source
+        self.target = target
+        self.near_duplicates = near_duplicates
+        self.bands = bands
+        self.ngram = ngram
+        self.hashes_path = hashes_path
+        self._paths = {'pairs': None, 'buckets': None}
+        if hashes_path is not None:
+            os.makedirs(hashes_path, exist_ok=True)
+            self._paths = {
+                'pairs': os.path.join(hashes_path, 'pairs.npy'),
+                'buckets': os.path.join(hashes_path,
+                                        f'buckets-{num_perm}-{bands}-{ngram}-{seed}.npy'),
+                }
+        self.pairs = HashSet(self._paths['pairs'])
+        self.buckets = HashSet(self._paths['buckets'])
+        self.counts = {'rows': 0, 'exact': 0, 'near': 0}
+
+        rng = np.random.default_rng(seed)
+        self._mult = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._add = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def normalize(text) -> str:
+        """Case-folded NFKC text with collapsed whitespace."""
+        return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+    def signature(self, text) -> np.ndarray:
+        """MinHash signature over character n-grams."""
+        grams = {text[i:i + self.ngram] for i in range(max(len(text) - self.ngram + 1, 1))}
+        hashes = np.fromiter((xxhash.xxh32_intdigest(gram) for gram in grams),
+                             dtype=np.uint64, count=len(grams))
+        return ((self._mult[:, None] * hashes[None, :] + self._add[:, None]) >> np.uint64(32)
+                ).min(axis=1)
+
+    def save(self) -> None:
+        """Save the pair and band hashes to hashes_path."""
+        if self.hashes_path is None:
+            raise ValueError('Deduplicator has no hashes_path to save to')
+        self.pairs.save(self._paths['pairs'])
+        self.buckets.save(self._paths['buckets'])
+
+    def _band_keys(self, text) -> list[int]:
+        """Helper function to hash each LSH band of a signature."""
+        bands = np.array_split(self.signature(text), self.bands)
+        return [xxhash.xxh3_64_intdigest(band.tobytes(), seed=i) for i, band in enumerate(bands)]
+
+    def __call__(self, _, chunk) -> np.ndarray:
+        sources = [self.normalize(text) for text in chunk[self.source]]
+        targets = [self.normalize(text) for text in chunk[self.target]]
+        keys = np.fromiter((xxhash.xxh3_64_intdigest(f'{src}\t{tgt}')
+                            for src, tgt in zip(sources, targets)),
+                           dtype=np.uint64, count=len(sources))
+
+        keep = np.zeros(len(keys), dtype=bool)
+        _, first = np.unique(keys, return_index=True)
+        keep[first] = True
+        keep &= ~self.pairs.contains(keys)
+        exact = int(np.count_nonzero(~keep))
+
+        if self.near_duplicates:
+            seen, kept = set(), []
+            for i in np.flatnonzero(keep):
+                bands = self._band_keys(f'{sources[i]}\t{targets[i]}')
+                if any(band in seen for band in bands) or self.buckets.contains(bands).any():
+                    keep[i] = False
+                    continue
+                seen.update(bands)
+                kept.extend(bands)
+            self.buckets.add(kept)
+
+        self.pairs.add(keys[keep])
+        self.counts['rows'] += len(keys)
+        self.counts['exact'] += exact
+        self.counts['near'] += int(np.count_nonzero(~keep)) - exact
+
+        return keep
+
 class IdiomataDataCleaning:
     """
     Idiomata data cleaning pipeline for parallel corpora extracted from OPUS.
@@ -28,6 +519,8 @@ class IdiomataDataCleaning:
         self.source = source
         self.target = target
         self.save_path = save_path
+        self.pipeline = FilterPipeline(source, target)
+        self.deduplicator = None
 
     def filter_by_langid(self) -> NoReturn:
         """
@@ -45,78 +538,538 @@ class IdiomataDataCleaning:
         target_filtered.to_csv(self.save_path, sep='\t', header=False,\
                                index=False, encoding='utf-8-sig')
 
+    def _moses_paths(self, bitext_path) -> tuple[str, str]:
+        """Helper function for the opus, or moses, file names of a bitext."""
+        src_path = bitext_path[:-4] + f".{self.source[:3].lower()}"
+        tgt_path = bitext_path[:-4] + f".{self.target[:3].lower()}"
+        return src_path, tgt_path
+
     def to_opus(self, bitext_path) -> NoReturn:
         """
         Convert .csv file (bitext) to opus, or moses, format.
-        """
-        src_path = bitext_path[:-4] + f".{self.source[:3].lower()}"
-        tgt_path = bitext_path[:-4] + f".{self.target[:3].lower()}"
-        bitext = pd.read_csv(bitext_path)
 
-        source = bitext[self.source]
-        target = bitext[self.target]
+        The bitext is streamed row by row, so memory does not grow with the corpus.
+        """
+        src_path, tgt_path = self._moses_paths(bitext_path)
 
-        source.to_csv(src_path, sep="\t", header=False, index=False, encoding='utf-8')
-        target.to_csv(tgt_path, sep="\t", header=False, index=False, encoding='utf-8')
+        with open(bitext_path, 'r', encoding='utf-8-sig', newline='') as file, \
+             open(src_path, 'w', encoding='utf-8') as src, \
+             open(tgt_path, 'w', encoding='utf-8') as tgt:
+            for row in csv.DictReader(file):
+                src.write(_moses_line(row[self.source] or ''))
+                tgt.write(_moses_line(row[self.target] or ''))
 
-    def to_bitext(self, source_path, target_path) -> NoReturn:
+    def to_bitext(self, source_path, target_path, output_format='csv') -> NoReturn:
         """
         Convert .txt file to a bitext.
+
+        The source file is memory-mapped and joined to the target file (text, orig_index)
+        through its line offsets in a single pass over the target.
+
+        :param source_path: moses file with one source sentence per line
+        :param target_path: output of filter_by_langid
+        :param output_format: 'csv' for a bitext.csv file or 'moses' for two aligned files
         """
         latter = source_path.split('/', 3)[-1]
         former = source_path.replace(latter, '')
         file_path = former + 'bitext.csv'
 
-        with open(source_path, 'r', encoding='utf-8') as file:
-            source_lines = file.readlines()
+        with LineIndex(source_path) as src_lines, \
+             open(target_path, 'r', encoding='utf-8-sig', newline='') as tgt_file:
+            if output_format == 'moses':
+                src_path, tgt_path = self._moses_paths(file_path)
+                with open(src_path, 'w', encoding='utf-8') as src, \
+                     open(tgt_path, 'w', encoding='utf-8') as tgt:
+                    for source, target in self._join(src_lines, tgt_file):
+                        src.write(_moses_line(source))
+                        tgt.write(_moses_line(target))
 
-        src = pd.DataFrame([t.strip().split('\t') for t in source_lines], columns=[self.source])
-        src['orig_index'] = src.index
+            elif output_format == 'csv':
+                with open(file_path, 'w', encoding='utf-8-sig', newline='') as file:
+                    writer = csv.writer(file, lineterminator='\n')
+                    writer.writerow([self.source, self.target])
+                    writer.writerows(self._join(src_lines, tgt_file))
 
-        tgt = pd.read_csv(target_path, sep='\t', names=[self.target, 'orig_index'])
+            else:
+                raise ValueError(f"Unknown output format: {output_format}")
 
-        bitext = pd.merge(src, tgt, on='orig_index', how='inner')
-        bitext = bitext.drop(columns=['orig_index'])
+    @staticmethod
+    def _join(src_lines, tgt_file):
+        """
+        Helper function to pair target rows with their source line by orig_index.
+        """
+        for row in csv.reader(tgt_file, delimiter='\t'):
+            if len(row) < 2 or not row[-1].isdigit():
+                continue
+
+            index = int(row[-1])
+            if index >= len(src_lines):
+                continue
 
-        bitext.to_csv(file_path, header=True, index=False, encoding='utf-8-sig')
+            yield src_lines[index].decode('utf-8').strip(), '\t'.join(row[:-1])
 
-    def _ftfy(self, example):
+    def _repair(self, chunk, pool, workers, cache, cache_size) -> pd.DataFrame:
         """
-        Helper function for fixing encoding. **PENDING**
+        Helper function for fixing encoding in a chunk of the bitext.
+
+        Repairs are memoized by a 128-bit hash of the original text in an LRU cache of at
+        most cache_size entries; unchanged text is stored as None so the cache only holds
+        strings that ftfy actually modified.
         """
-        for language in [self.source, self.target]:
-            text = ftfy.fix_text(example[language])
-            example[language] = text
+        columns = [language for language in (self.source, self.target) if language in chunk]
+
+        pending = {}
+        for text in itertools.chain.from_iterable(chunk[language] for language in columns):
+            if not _is_clean(text):
+                key = xxhash.xxh3_128_intdigest(text)
+                if key in cache:
+                    cache.move_to_end(key)
+                else:
+                    pending[key] = text
+
+        if pending:
+            texts = list(pending.values())
+            if pool is None:
+                fixed = _fix_texts(texts)
+            else:
+                size = -(-len(texts) // workers)
+                shards = [texts[i:i + size] for i in range(0, len(texts), size)]
+                fixed = itertools.chain.from_iterable(pool.map(_fix_texts, shards))
+
+            for (key, text), repaired in zip(pending.items(), fixed):
+                cache[key] = repaired if repaired != text else None
 
-        return example
+        def lookup(text):
+            if _is_clean(text):
+                return text
+            repaired = cache[xxhash.xxh3_128_intdigest(text)]
+            return text if repaired is None else repaired
 
-    def fix_encoding(self, bitext_path) -> NoReturn:
+        for language in columns:
+            chunk[language] = [lookup(text) for text in chunk[language]]
+
+        while len(cache) > cache_size:
+            cache.popitem(last=False)
+
+        return chunk
+
+    def fix_encoding(self, bitext_path, workers=None, chunk_size=100_000,
+                     cache_size=100_000) -> NoReturn:
         """
-        Fix broken encoding with ftfy library. **PENDING**
+        Fix broken encoding with ftfy library.
+
+        The bitext is streamed in chunks. Printable ASCII lines are skipped, recently seen
+        lines are repaired once and the remaining lines are sharded across a process pool.
+
+        :param bitext_path: bitext .csv file, rewritten in place
+        :param workers: number of processes (defaults to the number of cores, 1 disables the pool)
+        :param chunk_size: number of rows read per chunk
+        :param cache_size: maximum number of memoized repairs, kept for this call only
         """
-        bitext = pd.read_csv(bitext_path)
-        bitext = bitext.drop(columns=['orig_index'])
+        workers = workers or os.cpu_count()
+        cache = OrderedDict()
 
-        bitext_enc = bitext.apply(self._ftfy, axis=1)
-        bitext_enc.to_csv(bitext_path, header=True, index=False)
+        def transform(chunk):
+            chunk = chunk.drop(columns=['orig_index'], errors='ignore')
+            return self._repair(chunk, pool, workers, cache, cache_size)
 
-    def filter_by_alignment(self):
+        with ProcessPoolExecutor(workers) if workers > 1 else nullcontext() as pool:
+            _rewrite_bitext(bitext_path, None, transform, chunk_size)
+
+    def filter_by_alignment(self, encoder, cache_path, threshold=0.7, batch_size=64) -> NoReturn:
         """
-        TODO: LABSE embeddings for alignment.
+        Filter pairs by the cosine similarity of their (LaBSE) sentence embeddings.
+
+        Filters are registered on the pipeline and applied by apply_filters. Alignment runs
+        after the other filters, so only rows they keep are encoded and cached.
+
+        :param encoder: LaBSEEncoder or any callable mapping sentences to embeddings
+        :param cache_path: directory of the memory-mapped embedding cache
+        :param threshold: minimum cosine similarity to keep a pair
+        :param batch_size: number of sentences per encoder call
         """
-        return
+        scorer = AlignmentScorer(encoder, cache_path, batch_size=batch_size)
 
-    def filter_by_wordlength(self):
+        self.pipeline.add('alignment', lambda _, chunk: (
+            scorer.score(chunk[self.source], chunk[self.target]) >= threshold), expensive=True)
+
+    def filter_by_wordlength(self, min_length=1, max_length=250, max_chars=None) -> NoReturn:
         """
-        TODO: Filter datasets by predefined min/max.
+        Filter datasets by predefined min/max number of tokens on both sides.
+
+        Filters are registered on the pipeline and applied by apply_filters.
         """
-        return
+        def wordlength(stats, _):
+            return ((stats['src_tokens'] >= min_length) & (stats['src_tokens'] <= max_length) &
+                    (stats['tgt_tokens'] >= min_length) & (stats['tgt_tokens'] <= max_length))
 
-    def filter_by_alignmentlength(self):
+        self.pipeline.add('wordlength', wordlength)
+
+        if max_chars is not None:
+            self.pipeline.add('charlength', lambda stats, _: (
+                (stats['src_chars'] <= max_chars) & (stats['tgt_chars'] <= max_chars)))
+
+    def filter_by_alignmentlength(self, max_ratio=3.0, max_char_ratio=None) -> NoReturn:
         """
-        TODO: ???
+        Filter pairs whose source/target length ratio exceeds a threshold.
+
+        Filters are registered on the pipeline and applied by apply_filters.
         """
-        return
+        def ratio(longer, shorter):
+            return np.maximum(longer, shorter) / np.maximum(np.minimum(longer, shorter), 1)
+
+        self.pipeline.add('alignmentlength', lambda stats, _: (
+            ratio(stats['src_tokens'], stats['tgt_tokens']) <= max_ratio))
+
+        if max_char_ratio is not None:
+            self.pipeline.add('charratio', lambda stats, _: (
+                ratio(stats['src_chars'], stats['tgt_chars']) <= max_char_ratio))
+
+    def filter_duplicates(self, deduplicator=None) -> NoReturn:
+        """
+        Filter exact and near-duplicate pairs, keeping the first occurrence.
+
+        Filters are registered on the pipeline and applied by apply_filters. The same
+        deduplicator keeps its hashes across calls of apply_filters, so duplicates are
+        also removed across sources.
+        """
+        self.deduplicator = deduplicator or Deduplicator(self.source, self.target)
+        self.pipeline.add('duplicates', self.deduplicator)
+
+    def deduplicate(self, bitext_paths, near_duplicates=True, keep_index=False,
+                    chunk_size=100_000, hashes_path=None) -> pd.DataFrame:
+        """
+        Remove duplicates within and across bitexts in place, in one streaming pass each.
+
+        :param bitext_paths: bitext .csv files, one per source (e.g., OPEN_DATA)
+        :param near_duplicates: also remove MinHash-LSH near duplicates
+        :param keep_index: write the original row number of kept pairs as orig_index
+                           (an existing orig_index column is kept)
+        :param chunk_size: number of rows read per chunk
+        :param hashes_path: directory of the hashes of earlier runs, updated after each bitext
+        :return: duplicate rates per source
+        """
+        deduplicator = Deduplicator(self.source, self.target, near_duplicates=near_duplicates,
+                                    hashes_path=hashes_path)
+
+        data = []
+        for path in bitext_paths:
+            deduplicator.counts = dict.fromkeys(deduplicator.counts, 0)
+
+            def transform(chunk):
+                keep = deduplicator(None, chunk)
+                if keep_index and 'orig_index' not in chunk:
+                    chunk = chunk.assign(orig_index=chunk.index)
+                return chunk[keep]
+
+            _rewrite_bitext(path, None, transform, chunk_size)
+            if hashes_path is not None:
+                deduplicator.save()
+
+            counts = deduplicator.counts
+            data.append([path, counts['rows'], counts['exact'], counts['near'],
+                         (counts['exact'] + counts['near']) / max(counts['rows'], 1)])
+
+        return pd.DataFrame(data, columns=['Source', '# Rows', '# Duplicates',
+                                           '# Near Duplicates', 'Duplicate Rate'])
+
+    def apply_filters(self, bitext_path, save_path=None, chunk_size=100_000) -> dict[str, int]:
+        """
+        Apply every registered filter to the bitext in a single streaming pass.
+
+        :return: number of dropped rows per filter and in total
+        """
+        return self.pipeline.run(bitext_path, save_path, chunk_size)
+
+def token_batches(lengths, max_tokens) -> list[np.ndarray]:
+    """
+    Group row indices by length into batches of at most max_tokens padded tokens.
+
+    Rows are sorted by length, so each batch pads to its own longest row; a row longer
+    than max_tokens forms a batch of its own.
+    """
+    order = np.argsort(lengths, kind='stable')
+    batches, start = [], 0
+
+    for end in range(1, len(order) + 1):
+        if end == len(order) or lengths[order[end]] * (end + 1 - start) > max_tokens:
+            batches.append(order[start:end])
+            start = end
+
+    return batches
+
+class TranslationCache:
+    """
+    Persistent memo of translations in a SQLite file.
+
+    Entries are keyed by an xxh3-128 hash of the namespace (model name, task prefix and
+    generation settings) and the normalized source text. The least recently used entries
+    are evicted once the cache holds more than max_entries translations.
+
+    The number of entries is tracked from the rows each put inserts or evicts and is
+    recounted every resync_puts calls, since several processes may share the file.
+    """
+
+    def __init__(self, path, namespace, max_entries=1_000_000, resync_puts=1000):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.resync_puts = resync_puts
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS translations '
+                                '(key BLOB PRIMARY KEY, value TEXT, used INTEGER)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS translations_used '
+                                'ON translations (used)')
+        self._clock = self.connection.execute(
+            'SELECT COALESCE(MAX(used), 0) FROM translations').fetchone()[0]
+        self._count = len(self)
+        self._puts = 0
+
+    @staticmethod
+    def normalize(text) -> str:
+        """NFC text with collapsed whitespace."""
+        return ' '.join(unicodedata.normalize('NFC', text).split())
+
+    def key(self, text) -> bytes:
+        """Cache key of a source sentence."""
+        return xxhash.xxh3_128_digest(f'{self.namespace}\x00{self.normalize(text)}')
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+
+    def get(self, texts) -> list:
+        """Cached translations of texts, None for misses."""
+        keys = [self.key(text) for text in texts]
+        found = {}
+
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            query = f"SELECT key, value FROM translations WHERE key IN ({','.join('?' * len(chunk))})"
+            found.update(self.connection.execute(query, chunk).fetchall())
+
+        if found:
+            self._clock += 1
+            with self.connection:
+                self.connection.executemany('UPDATE translations SET used = ? WHERE key = ?',
+                                            [(self._clock, key) for key in found])
+
+        return [found.get(key) for key in keys]
+
+    def put(self, texts, translations) -> None:
+        """Store translations and evict the least recently used entries."""
+        self._clock += 1
+        self._puts += 1
+        rows = [(value, self._clock, self.key(text)) for text, value in zip(texts, translations)]
+
+        with self.connection:
+            # Existing keys are updated first so the insert's rowcount is the number of new keys.
+            self.connection.executemany('UPDATE translations SET value = ?, used = ? WHERE key = ?',
+                                        rows)
+            inserted = self.connection.executemany(
+                'INSERT OR IGNORE INTO translations (value, used, key) VALUES (?, ?, ?)', rows)
+
+            if self._puts % self.resync_puts == 0:
+                self._count = len(self)
+            else:
+                self._count += max(inserted.rowcount, 0)
+
+            excess = self._count - self.max_entries
+            if excess > 0:
+                deleted = self.connection.execute(
+                    'DELETE FROM translations WHERE key IN '
+                    '(SELECT key FROM translations ORDER BY used LIMIT ?)', (excess,))
+                self._count -= deleted.rowcount
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+        self.connection.close()
+
+class CheckpointWriter:
+    """
+    Streams results to Parquet parts with a manifest of completed row ranges.
+
+    Each part is written under a temporary name and renamed when complete, then recorded
+    as one line of manifest.jsonl; appends of single lines keep the manifest consistent
+    when several worker processes share the directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.jsonl')
+        os.makedirs(directory, exist_ok=True)
+
+    def completed(self) -> dict[tuple[int, int], str]:
+        """Completed row ranges and their part files."""
+        parts = {}
+        if not os.path.exists(self.manifest_path):
+            return parts
+
+        with open(self.manifest_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # line cut short by an interrupted run
+                path = os.path.join(self.directory, entry['file'])
+                if os.path.exists(path):
+                    parts[(entry['start'], entry['end'])] = path
+
+        return parts
+
+    def write(self, start, end, table) -> None:
+        """Write rows [start, end) as a part and record it in the manifest."""
+        name = f'part-{start:012d}-{end:012d}.parquet'
+        path = os.path.join(self.directory, name)
+        pq.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+        with open(self.manifest_path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps({'start': start, 'end': end, 'file': name,
+                                   'rows': table.num_rows}) + '\n')
+
+    def compact(self, save_path, total=None) -> int:
+        """
+        Concatenate the parts in row order into a .csv file, one part in memory at a time.
+
+        Parts may overlap when runs used different checkpoint_rows or shards. Each row is
+        taken from exactly one part, preferring the part that reaches furthest.
+
+        :param total: expected number of rows; raises ValueError if ranges are missing
+        :return: number of rows written
+        """
+        parts = sorted(self.completed().items())
+        position, cover, i = 0, [], 0
+        while True:
+            best = None
+            while i < len(parts) and parts[i][0][0] <= position:
+                if parts[i][0][1] > position and (best is None or parts[i][0][1] > best[0][1]):
+                    best = parts[i]
+                i += 1
+            if best is None:
+                break
+            cover.append((position - best[0][0], best[1]))
+            position = best[0][1]
+
+        if i < len(parts):
+            raise ValueError(f"Missing rows [{position}, {parts[i][0][0]}) in {self.directory}")
+        if total is not None and position != total:
+            raise ValueError(f"Missing rows [{position}, {total}) in {self.directory}")
+
+        with open(save_path, 'w', encoding='utf-8', newline='') as file:
+            for j, (offset, path) in enumerate(cover):
+                table = pq.read_table(path).slice(offset)
+                table.to_pandas().to_csv(file, header=j == 0, index=False)
+
+        return position
+
+def _ranges(start, end, step) -> list[tuple[int, int]]:
+    """Helper function to split [start, end) into consecutive ranges of step rows."""
+    return [(i, min(i + step, end)) for i in range(start, end, step)]
+
+def _uncovered(start, end, intervals) -> list[tuple[int, int]]:
+    """Helper function for the sub-ranges of [start, end) outside every interval."""
+    gaps, position = [], start
+    for low, high in sorted(intervals):
+        if low >= end:
+            break
+        if low > position:
+            gaps.append((position, low))
+        position = max(position, high)
+
+    if position < end:
+        gaps.append((position, end))
+    return gaps
+
+def _uniform(keys, positions, stream) -> np.ndarray:
+    """
+    Helper function for counter-based uniform floats in [0, 1).
+
+    Each (key, position, stream) triple is hashed with the SplitMix64 finalizer, so the
+    value of a token does not depend on the other tokens drawn with it.
+    """
+    counters = positions.astype(np.uint64) * np.uint64(4) + np.uint64(stream + 1)
+    with np.errstate(over='ignore'):
+        z = keys + counters * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0**-53
+
+class NoiseAugmenter:
+    """
+    Vectorized word-level noise (dropout, local swaps and dictionary replacement).
+
+    A batch is tokenized once on whitespace into a flat token array with a sentence id per
+    token, and each noise type is a mask over the whole batch. The random values of a token
+    are hashed from the seed, its sentence, the occurrence of that sentence in the batch and
+    its position, so a sentence gets the same noise however the input is split into batches
+    (repeats of a sentence within one batch get different noise).
+    """
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.dropout = 0.0
+        self.swap = 0.0
+        self.replacement = 0.0
+        self.synonyms = {}
+
+    @property
+    def active(self) -> bool:
+        """Whether any noise is configured."""
+        return bool(self.dropout or self.swap or (self.replacement and self.synonyms))
+
+    def apply(self, texts) -> list[str]:
+        """Add noise to a batch of sentences."""
+        texts = list(texts)
+        seen = {}
+        keys = np.empty(len(texts), dtype=np.uint64)
+        for i, text in enumerate(texts):
+            occurrence = seen[text] = seen.get(text, -1) + 1
+            keys[i] = xxhash.xxh3_64_intdigest(f'{occurrence}\x00{text}', seed=self.seed)
+
+        split = [text.split() for text in texts]
+        lengths = np.fromiter(map(len, split), dtype=np.int64, count=len(split))
+        tokens = np.empty(int(lengths.sum()), dtype=object)
+        tokens[:] = list(itertools.chain.from_iterable(split))
+        sentence = np.repeat(np.arange(len(texts)), lengths)
+        position = np.arange(len(tokens)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        if self.replacement and self.synonyms:
+            candidates = np.fromiter((token in self.synonyms for token in tokens),
+                                     dtype=bool, count=len(tokens))
+            draws = _uniform(keys[sentence], position, 0) < self.replacement
+            chosen = np.flatnonzero(candidates & draws)
+            picks = _uniform(keys[sentence[chosen]], position[chosen], 1)
+            for index, pick in zip(chosen, picks):
+                options = self.synonyms[tokens[index]]
+                tokens[index] = options[int(pick * len(options))]
+
+        if self.dropout:
+            keep = _uniform(keys[sentence], position, 2) >= self.dropout
+            emptied = (np.bincount(sentence[keep], minlength=len(texts)) == 0) & (lengths > 0)
+            keep[(np.cumsum(lengths) - lengths)[emptied]] = True
+            tokens, sentence, position = tokens[keep], sentence[keep], position[keep]
+
+        if self.swap:
+            last = np.append(sentence[1:] != sentence[:-1], True)
+            swapped = (_uniform(keys[sentence], position, 3) < self.swap) & ~last
+            order = np.arange(len(tokens))
+            # Within a run of candidates, swap every other position so pairs never overlap.
+            starts = swapped & ~np.concatenate([[False], swapped[:-1]])
+            run = order - np.maximum.accumulate(np.where(starts, order, 0))
+            swapped &= run % 2 == 0
+            first = np.flatnonzero(swapped)
+            order[first], order[first + 1] = first + 1, first
+            tokens = tokens[order]
+
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(sentence, minlength=len(texts)))])
+        return [' '.join(tokens[bounds[i]:bounds[i + 1]]) for i in range(len(texts))]
+
+    def augment(self, texts, batch_size=10_000):
+        """Lazily add noise to an iterable of sentences, one batch in memory at a time."""
+        iterator = iter(texts)
+        while batch := list(itertools.islice(iterator, batch_size)):
+            yield from self.apply(batch)
 
 @dataclass
 class Pair:
@@ -140,9 +1093,13 @@ class BackTranslation:
     """
     Backtranslation for a monolingual corpus. **May need to extrapolate to Colab**
 
-    TODO: include LABSE alignment 
+    The translated bitext can be scored with IdiomataDataCleaning.filter_by_alignment.
     """
-    def __init__(self, translator, corpus, pair):
+    def __init__(self, translator, corpus, pair, cache_path=None, cache_size=1_000_000):
+        self.model_name = translator.model_name
+        self.corpus = corpus
+        self.cache_path = cache_path
+        self.cache_size = cache_size
         self.translator = MarianMTModel.from_pretrained(translator.model_name)
         self.tokenizer = MarianTokenizer.from_pretrained(translator.model_name)
         self.task_prefix = translator.task_prefix
@@ -153,103 +1110,530 @@ class BackTranslation:
                                     split='train')
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.translator.to(self.device)
+        self.generation = {'num_beams': 1, 'max_length': self.tokenizer.model_max_length,
+                           'use_cache': True}
+        self.quantized = False
+        self.cache = None
+        self.augmenter = NoiseAugmenter()
+
+        if cache_path is not None:
+            self.cache = TranslationCache(cache_path, self._namespace(), max_entries=cache_size)
 
-    def translate(self, batch):
+    def _namespace(self) -> str:
         """
-        Helper function to translate text.
+        Helper function for the settings that determine a translation.
+        """
+        return json.dumps([self.model_name, self.task_prefix, self.generation,
+                           'int8' if self.quantized else 'fp32'], sort_keys=True)
+
+    def optimize_for_cpu(self, quantize=True, threads=None, interop_threads=None,
+                         warmup=True) -> None:
         """
-        inputs = list(batch[self.target])
-        inputs = [self.task_prefix + x for x in inputs]
+        Opt-in CPU inference mode.
 
-        encoded = self.tokenizer(
+        Applies dynamic int8 quantization to the linear layers of the Marian model and sets
+        the intra-op/inter-op thread counts. Quantized translations are cached separately
+        from fp32 ones; use benchmark.py to measure the BLEU/chrF change on a sample.
+
+        :param quantize: apply dynamic int8 quantization
+        :param threads: intra-op threads (torch.set_num_threads)
+        :param interop_threads: inter-op threads, only settable before any parallel work
+        :param warmup: run one short translation to initialize kernels and allocators
+        """
+        self.device = torch.device('cpu')
+        self.translator.to(self.device).eval()
+
+        if threads is not None:
+            torch.set_num_threads(threads)
+        if interop_threads is not None:
+            try:
+                torch.set_num_interop_threads(interop_threads)
+            except RuntimeError as exc:
+                # Already fixed once inter-op parallel work has started in this process.
+                logging.warning("Ignoring interop_threads=%d, keeping %d inter-op threads: %s",
+                                interop_threads, torch.get_num_interop_threads(), exc)
+
+        if quantize and not self.quantized:
+            self.translator = torch.ao.quantization.quantize_dynamic(
+                self.translator, {torch.nn.Linear}, dtype=torch.qint8)
+            self.quantized = True
+
+        if self.cache is not None:
+            self.cache.namespace = self._namespace()
+
+        if warmup:
+            self._generate(self._encode(['warm up']))
+
+    def _encode(self, texts) -> list[list[int]]:
+        """
+        Helper function to tokenize text without padding.
+        """
+        inputs = [self.task_prefix + x for x in texts]
+
+        return self.tokenizer(
             inputs,
             max_length=self.tokenizer.model_max_length,
             truncation=True,
-            padding=True,
-            return_tensors='pt',
-            )
+            )['input_ids']
 
-        input_ids = encoded.input_ids.to(self.device)
-        attention_mask = encoded.attention_mask.to(self.device)
+    def _generate(self, input_ids) -> list[str]:
+        """
+        Helper function to pad one batch of token ids and translate it.
+        """
+        encoded = self.tokenizer.pad({'input_ids': input_ids}, return_tensors='pt')
 
-        output = self.translator.generate(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            num_beams=1,
-            max_length=self.tokenizer.model_max_length,
-            )
+        with torch.inference_mode():
+            output = self.translator.generate(
+                input_ids=encoded.input_ids.to(self.device),
+                attention_mask=encoded.attention_mask.to(self.device),
+                **self.generation,
+                )
 
-        decoded = self.tokenizer.batch_decode(
+        return self.tokenizer.batch_decode(
             output,
             skip_special_tokens=True
             )
 
+    def _translate_texts(self, texts, max_tokens=None) -> list[str]:
+        """
+        Helper function to translate a list of text, optionally in token-budget batches.
+        """
+        input_ids = self._encode(texts)
+
+        if max_tokens is None:
+            return self._generate(input_ids)
+
+        decoded = [None] * len(texts)
+        lengths = np.fromiter(map(len, input_ids), dtype=np.int64, count=len(input_ids))
+
+        for indices in token_batches(lengths, max_tokens):
+            outputs = self._generate([input_ids[i] for i in indices])
+            for index, text in zip(indices, outputs):
+                decoded[index] = text
+
+        return decoded
+
+    def translate(self, batch, max_tokens=None):
+        """
+        Helper function to translate text.
+
+        With a translation cache, only unique sentences missing from the cache are
+        translated.
+
+        :param batch: batch of the monolingual dataset
+        :param max_tokens: if given, the batch is sorted by tokenized length and split into
+                           sub-batches of at most max_tokens padded tokens
+        """
         targets = list(batch[self.target])
 
+        if self.cache is None:
+            decoded = self._translate_texts(targets, max_tokens)
+        else:
+            decoded = self.cache.get(targets)
+
+            misses = {}
+            for i, (text, cached) in enumerate(zip(targets, decoded)):
+                if cached is None:
+                    misses.setdefault(self.cache.normalize(text), []).append(i)
+
+            if misses:
+                texts = [targets[indices[0]] for indices in misses.values()]
+                outputs = self._translate_texts(texts, max_tokens)
+                self.cache.put(texts, outputs)
+
+                for indices, output in zip(misses.values(), outputs):
+                    for i in indices:
+                        decoded[i] = output
+
+        if self.augmenter.active:
+            decoded = self.augmenter.apply(decoded)
+
         return {
             self.source: decoded,
             self.target: targets,
         }
 
-    def word_dropout(self, probability=0.1):
+    def word_dropout(self, probability=0.1) -> None:
         """
-        TODO: Transform the source sentences with noise: word dropout.
+        Transform the source sentences with noise: word dropout.
+
+        Each word is dropped with the given probability; every sentence keeps a word.
         """
-        #the probablity relates to the sentence, or the word? likely the word.
-        # for each sentence, word dropout is applied.
-        # 1. use a tokenizer to get words
-        # 2. implement some sort of prob
-        # pdb.set_trace()
-        # self.datasets
-        return
+        self.augmenter.dropout = probability
 
-    def word_replacement(self):
+    def word_replacement(self, synonyms, probability=0.1) -> None:
         """
-        TODO: Replace words with synset.
+        Replace words with synset.
+
+        :param synonyms: dictionary of word -> list of replacements
+        :param probability: probability of replacing a word that has replacements
         """
-        return
+        self.augmenter.synonyms = synonyms
+        self.augmenter.replacement = probability
 
-    def word_swap(self):
+    def word_swap(self, probability=0.1) -> None:
         """
-        TODO: swap words based on probability.
+        Swap words with their right neighbour based on probability (without overlaps).
         """
-        return 
+        self.augmenter.swap = probability
 
-    def translate_monolingual(self, save_path) -> None:
+    def _translate_range(self, writer, start, end, batch_size, max_tokens,
+                         checkpoint_rows) -> None:
         """
-        Use helper function to map translations to dataset object.
+        Helper function to translate rows [start, end) into checkpointed parts.
+
+        Rows covered by ranges already recorded by the writer are skipped, whatever
+        checkpoint_rows those ranges were written with.
         """
-        results = self.dataset.map(
-            self.translate,
-            batched=True,
-            batch_size=125,
-            )
+        gaps = _uncovered(start, end, writer.completed())
+        parts = itertools.chain.from_iterable(_ranges(low, high, checkpoint_rows)
+                                              for low, high in gaps)
+
+        for part_start, part_end in parts:
+            rows = self.dataset[part_start:part_end]
+            decoded = []
+            for i in range(0, part_end - part_start, batch_size):
+                batch = {self.target: rows[self.target][i:i + batch_size]}
+                decoded.extend(self.translate(batch, max_tokens=max_tokens)[self.source])
+
+            writer.write(part_start, part_end, pa.table({**rows, self.source: decoded}))
+
+    def translate_monolingual(self, save_path, batch_size=125, max_tokens=None, workers=1,
+                              shards=None, threads=None, checkpoint_rows=10_000) -> None:
+        """
+        Translate the monolingual corpus into a bitext.
+
+        Results are streamed as batches finish to Parquet parts in save_path.parts/ with a
+        manifest of completed row ranges; an interrupted run resumes from the missing ranges
+        and the parts are finally compacted into save_path. Delete save_path.parts/ to start
+        over, e.g. after changing the model.
 
-        results.to_pandas()
-        results.to_csv(save_path, header=True, index=False)
+        :param save_path: output .csv file
+        :param batch_size: rows per batch; with max_tokens, the window of rows that is
+                           sorted by length before forming token-budget batches (e.g., 10000)
+        :param max_tokens: maximum number of padded tokens per generate call
+        :param workers: number of processes, each with its own model replica
+        :param shards: number of contiguous shards when workers > 1 (defaults to workers)
+        :param threads: intra-op threads per worker (defaults to cores // workers)
+        :param checkpoint_rows: rows per Parquet part
+        """
+        writer = CheckpointWriter(save_path + '.parts')
+
+        if workers > 1:
+            self._translate_sharded(writer, batch_size, max_tokens, workers,
+                                    shards or workers, threads, checkpoint_rows)
+        else:
+            self._translate_range(writer, 0, len(self.dataset), batch_size, max_tokens,
+                                  checkpoint_rows)
+
+        writer.compact(save_path, total=len(self.dataset))
 
-def huggingface_push(bitexts_list, bitext_dict) -> None:
+    def _translate_sharded(self, writer, batch_size, max_tokens, workers, shards, threads,
+                           checkpoint_rows) -> None:
+        """
+        Helper function to translate contiguous shards of the corpus in worker processes.
+
+        Shards whose rows are all covered by the manifest are not restarted.
+        """
+        bounds = np.linspace(0, len(self.dataset), shards + 1, dtype=np.int64).tolist()
+        completed = writer.completed()
+        settings = {
+            'model_name': self.model_name, 'task_prefix': self.task_prefix,
+            'corpus': self.corpus, 'source': self.source, 'target': self.target,
+            'cache_path': self.cache_path, 'cache_size': self.cache_size,
+            'quantized': self.quantized, 'batch_size': batch_size, 'max_tokens': max_tokens,
+            'threads': threads or max(1, (os.cpu_count() or 1) // workers),
+            'checkpoint_rows': checkpoint_rows, 'augmenter': self.augmenter,
+            }
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            futures = [pool.submit(_translate_shard, settings, start, end, writer.directory)
+                       for start, end in zip(bounds[:-1], bounds[1:])
+                       if _uncovered(start, end, completed)]
+            for future in futures:
+                future.result()
+
+def _translate_shard(settings, start, end, directory) -> None:
+    """
+    Helper function to translate rows [start, end) of the corpus in a worker process.
+    """
+    torch.set_num_threads(settings['threads'])
+
+    backtranslation = BackTranslation(
+        Translator(settings['model_name'], settings['task_prefix']), settings['corpus'],
+        Pair(settings['source'], settings['target']), cache_path=settings['cache_path'],
+        cache_size=settings['cache_size'])
+    backtranslation.augmenter = settings['augmenter']
+    if settings['quantized']:
+        backtranslation.optimize_for_cpu(threads=settings['threads'], warmup=False)
+
+    backtranslation._translate_range( # pylint: disable=protected-access
+        CheckpointWriter(directory), start, end, settings['batch_size'],
+        settings['max_tokens'], settings['checkpoint_rows'])
+
+def _digests(path) -> tuple[str, str]:
+    """Helper function for the sha256 and git blob hashes of a file."""
+    sha256, blob = hashlib.sha256(), hashlib.sha1()
+    blob.update(f'blob {os.path.getsize(path)}\0'.encode())
+
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            sha256.update(block)
+            blob.update(block)
+
+    return sha256.hexdigest(), blob.hexdigest()
+
+class HfHub:
+    """
+    Hugging Face dataset repository used by huggingface_push.
+
+    Uploads and deletions are staged and pushed as a single Hub commit by commit(). The
+    LFS content of an upload is sent right away, so the local file can be removed before
+    the commit.
+    """
+
+    def __init__(self, repo_id, token=None):
+        self.repo_id = repo_id
+        self.api = HfApi(token=token)
+        self.api.create_repo(repo_id, repo_type='dataset', exist_ok=True)
+        self.operations = []
+
+    def files(self) -> dict[str, str]:
+        """Files in the repository and their sha256 (LFS) or git blob hash."""
+        return {entry.path: entry.lfs.sha256 if entry.lfs else entry.blob_id
+                for entry in self.api.list_repo_tree(self.repo_id, repo_type='dataset',
+                                                     recursive=True)
+                if hasattr(entry, 'blob_id')}
+
+    def upload(self, local_path, path_in_repo) -> None:
+        """Pre-upload one file and stage it for the next commit."""
+        operation = CommitOperationAdd(path_in_repo=path_in_repo, path_or_fileobj=local_path)
+        self.api.preupload_lfs_files(self.repo_id, additions=[operation], repo_type='dataset')
+        if isinstance(operation.path_or_fileobj, str):
+            # Regular (non-LFS) files are sent with the commit, so keep their bytes.
+            with open(local_path, 'rb') as file:
+                operation.path_or_fileobj = file.read()
+        self.operations.append(operation)
+
+    def read(self, path_in_repo) -> str:
+        """Text of one file."""
+        path = self.api.hf_hub_download(self.repo_id, path_in_repo, repo_type='dataset')
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def delete(self, path_in_repo) -> None:
+        """Stage the deletion of one file for the next commit."""
+        self.operations.append(CommitOperationDelete(path_in_repo=path_in_repo))
+
+    def commit(self, message) -> None:
+        """Push the staged uploads and deletions as one commit."""
+        if self.operations:
+            self.api.create_commit(self.repo_id, self.operations, commit_message=message,
+                                   repo_type='dataset')
+        self.operations = []
+
+class LocalHub:
+    """
+    Local directory stand-in for a Hugging Face dataset repository, optionally git-backed.
+    """
+
+    def __init__(self, path, git=False):
+        self.path = path
+        self.git = git
+        os.makedirs(path, exist_ok=True)
+        if git and not os.path.isdir(os.path.join(path, '.git')):
+            subprocess.run(['git', 'init', '-q'], cwd=path, check=True)
+
+    def files(self) -> dict[str, str]:
+        """Files in the repository and their sha256."""
+        files = {}
+        for root, dirs, names in os.walk(self.path):
+            dirs[:] = [name for name in dirs if name != '.git']
+            for name in names:
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, self.path).replace(os.sep, '/')] = _digests(path)[0]
+        return files
+
+    def upload(self, local_path, path_in_repo) -> None:
+        """Copy one file."""
+        destination = os.path.join(self.path, path_in_repo)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(local_path, destination)
+
+    def read(self, path_in_repo) -> str:
+        """Text of one file."""
+        with open(os.path.join(self.path, path_in_repo), 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def delete(self, path_in_repo) -> None:
+        """Delete one file."""
+        os.remove(os.path.join(self.path, path_in_repo))
+
+    def commit(self, message) -> None:
+        """Commit the working tree when git-backed."""
+        if self.git:
+            subprocess.run(['git', 'add', '-A'], cwd=self.path, check=True)
+            subprocess.run(['git', '-c', 'user.name=huggingface_push', '-c',
+                            'user.email=huggingface_push@localhost', 'commit', '-q',
+                            '--allow-empty', '-m', message], cwd=self.path, check=True)
+
+def _write_shards(csv_path, shard_prefix, max_shard_size) -> \
+        Iterator[tuple[str, pa.Schema, int]]:
+    """
+    Helper function to stream a bitext .csv file into Parquet shards of at most about
+    max_shard_size bytes each.
+
+    Yields (path, schema, rows) as soon as a shard is closed, so it can be uploaded and
+    removed before the next one is written; an empty bitext gives one empty shard.
+
+    All columns except idx/orig_index are read as strings, so type inference on the
+    first block cannot break later blocks. Quoted values may contain newlines, so rows
+    can span block boundaries.
+    """
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as file:
+        header = next(csv.reader(file))
+
+    reader = pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(block_size=max(min(max_shard_size, 1 << 24), 1 << 10)),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in header
+                          if name not in ('idx', 'orig_index')},
+            strings_can_be_null=False),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        )
+
+    shards = rows = 0
+    sink = writer = None
+
+    for batch in reader:
+        if writer is None:
+            path = f'{shard_prefix}-{shards:05d}.parquet'
+            shards, rows = shards + 1, 0
+            sink = pa.OSFile(path, 'wb')
+            writer = pq.ParquetWriter(sink, reader.schema)
+
+        writer.write_batch(batch)
+        rows += batch.num_rows
+
+        if sink.tell() >= max_shard_size:
+            writer.close()
+            sink.close()
+            writer = None
+            yield path, reader.schema, rows
+
+    if writer is not None:
+        writer.close()
+        sink.close()
+        yield path, reader.schema, rows
+    elif shards == 0:
+        path = f'{shard_prefix}-00000.parquet'
+        pq.write_table(reader.schema.empty_table(), path)
+        yield path, reader.schema, 0
+
+def _dataset_card(configs, readme='') -> str:
+    """
+    Helper function for the README.md of the dataset with configs and dataset_info.
+
+    Only the configs and dataset_info entries of the pushed configs are replaced in the
+    YAML metadata block of an existing readme; other metadata and the card body are kept.
+    """
+    dtypes = {'string': 'string', 'large_string': 'string', 'double': 'float64',
+              'float': 'float32'}
+    metadata, body = {}, readme
+    if readme.startswith('---\n'):
+        header, separator, rest = ('\n' + readme[4:]).partition('\n---\n')
+        if separator:
+            metadata, body = yaml.safe_load(header) or {}, rest
+
+    for key in ('configs', 'dataset_info'):
+        metadata[key] = [entry for entry in metadata.get(key) or []
+                         if entry.get('config_name') not in configs]
+
+    for name, splits in configs.items():
+        metadata['configs'].append({
+            'config_name': name,
+            'data_files': [{'split': split, 'path': f'{name}/{split}-*'} for split in splits],
+            })
+        schema = next(iter(splits.values()))['schema']
+        metadata['dataset_info'].append({
+            'config_name': name,
+            'features': [{'name': field.name, 'dtype': dtypes.get(str(field.type),
+                                                                  str(field.type))}
+                         for field in schema],
+            'splits': [{'name': split, 'num_bytes': info['num_bytes'],
+                        'num_examples': info['num_examples']}
+                       for split, info in splits.items()],
+            'download_size': sum(info['num_bytes'] for info in splits.values()),
+            'dataset_size': sum(info['num_bytes'] for info in splits.values()),
+            })
+
+    return f"---\n{yaml.safe_dump(metadata, sort_keys=False, allow_unicode=True)}---\n{body}"
+
+def huggingface_push(bitext_dict, repo_id=None, hub=None, max_shard_size=500_000_000,
+                     staging_dir=None) -> dict:
     """
     Push dataset to Hugging Face hub.
+
+    Each bitext .csv file is streamed into size-bounded Parquet shards laid out as
+    {config}/{split}-NNNNN.parquet with a README.md card listing the configs and their
+    dataset_info row counts; the metadata of an existing card is updated and its body is
+    kept. Each shard is uploaded as soon as it is written (only if its content differs
+    from the repository) and removed from staging, so staging holds one shard at a time.
+    Stale shards are deleted and all changes are pushed as one commit.
+
+    :param bitext_dict: {config: path} or {config: {split: path}} for every config of the
+                        dataset, e.g. {"OpenSubtitles": "data/OpenSubtitles/bitext.csv", ...}
+    :param repo_id: Hugging Face dataset repository (ignored when hub is given)
+    :param hub: HfHub or LocalHub
+    :param max_shard_size: approximate maximum bytes per shard
+    :param staging_dir: local directory for the shards (defaults to a temporary directory)
+    :return: configs with their splits, row counts and uploaded files
     """
-    datasets = []
-
-    for path in bitexts_list:
-        bitext = Dataset.from_pandas(pd.read_csv(path))
-        datasets.append(bitext)
-
-    ddict = DatasetDict(bitext_dict)
-    # TODO
-    # ddict = DatasetDict({
-    #     "OpenSubtitles": opensubtitles,
-    #     "Tatoeba": tatoeba,
-    #     "KDE4": KDE4,
-    #     "wikimedia": wikimedia,
-    #     "GNOME": GNOME,
-    #     "PILARliterary": PILAR1,
-    #     "PILARcrawled": PILAR2
-    #     })
-    return ddict
+    hub = hub or HfHub(repo_id)
+    remote = hub.files()
+    configs, produced, uploaded = {}, set(), []
+
+    with tempfile.TemporaryDirectory(dir=staging_dir) as staging:
+        for name, splits in bitext_dict.items():
+            splits = {'train': splits} if isinstance(splits, str) else splits
+            configs[name] = {}
+
+            for split, path in splits.items():
+                os.makedirs(os.path.join(staging, name), exist_ok=True)
+                info = configs[name][split] = {'schema': None, 'num_examples': 0, 'num_bytes': 0}
+
+                for shard, schema, rows in _write_shards(
+                        path, os.path.join(staging, name, split), max_shard_size):
+                    info['schema'] = schema
+                    info['num_examples'] += rows
+                    info['num_bytes'] += os.path.getsize(shard)
+                    path_in_repo = os.path.relpath(shard, staging).replace(os.sep, '/')
+                    produced.add(path_in_repo)
+                    if remote.get(path_in_repo) not in _digests(shard):
+                        hub.upload(shard, path_in_repo)
+                        uploaded.append(path_in_repo)
+                    os.remove(shard)
+
+        card = os.path.join(staging, 'README.md')
+        with open(card, 'w', encoding='utf-8') as file:
+            file.write(_dataset_card(configs, hub.read('README.md') if 'README.md' in remote
+                                              else ''))
+        if remote.get('README.md') not in _digests(card):
+            hub.upload(card, 'README.md')
+            uploaded.append('README.md')
+
+    for path_in_repo in remote:
+        if path_in_repo.split('/', 1)[0] in configs and path_in_repo not in produced:
+            hub.delete(path_in_repo)
+
+    hub.commit(f"Update {', '.join(configs)}")
+
+    for splits in configs.values():
+        for info in splits.values():
+            info.pop('schema')
+    return {'configs': configs, 'uploaded': uploaded}
 
 
 def main():
@@ -17,11 +17,14 @@ import os
 import re
 import sys
 import ast
+import itertools
 import logging
+from concurrent.futures import ThreadPoolExecutor
 # import pdb
 
 from huggingface_hub import HfApi
-from datasets import load_dataset_builder, disable_progress_bar, get_dataset_config_names
+from datasets import load_dataset, load_dataset_builder, disable_progress_bar, \
+                     get_dataset_config_names
 import pandas as pd
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(message)s', \
@@ -32,6 +35,11 @@ COLS = ['Author/Dataset', 'Date of Creation', 'Last Modified', 'Dataset Type', \
         'Hugging Face Link', 'Downloads Last Month', '# Likes', '# Languages', \
         'Supported Languages']
 COLS2 = ['Author/Dataset', 'Language Pair', '# Train Set', '# Development Set', '# Test Set']
+COLS4 = ['Author/Dataset', 'Suggested Type', 'Confidence', 'Language Pairs']
+PAIR_PATTERN = r'[a-z]{2,3}((_|-)\w+)?(-|2)[a-z]{2,3}((_|-)\w+)?'
+LANGUAGE_PATTERN = r'[a-z]{2,3}((_|-)\w+)?'
+SOURCE_TARGET = [('source', 'target'), ('src', 'tgt'), ('src_text', 'tgt_text'),
+                 ('sourcestring', 'targetstring')]
 
 def create_spreadsheet(datasets, init=False) -> pd.DataFrame:
     """
@@ -235,9 +243,7 @@ def create_pairs(dataframe, update=('Default', False), verbose=True) -> tuple[pd
                     log_missing_data(row['Author/Dataset'], missing_type=update[0])
                     continue
 
-                pattern = r'[a-z]{2,3}((_|-)\w+)?(-|2)[a-z]{2,3}((_|-)\w+)?'
-
-                if not re.fullmatch(pattern, configs[0]):
+                if not re.fullmatch(PAIR_PATTERN, configs[0]):
                     logging.info("Error loading %s. Not a match!", identifier)
                     log_missing_data(row['Author/Dataset'], missing_type=update[0])
                     continue
@@ -272,6 +278,165 @@ def create_pairs(dataframe, update=('Default', False), verbose=True) -> tuple[pd
 
     return pairs_df, edge_cases
 
+def is_text(value) -> bool:
+    """
+    Returns whether a sample value is a string or a tokenized (list of strings) text.
+    """
+    return isinstance(value, str) or (isinstance(value, list) and bool(value) and
+                                      all(isinstance(token, str) for token in value))
+
+def is_media(value) -> bool:
+    """
+    Returns whether a sample value is an audio or image feature.
+    """
+    return (isinstance(value, dict) and bool({'array', 'bytes', 'path'} & set(value))) or \
+           type(value).__module__.startswith('PIL.')
+
+def classify_sample(rows, configs, languages) -> tuple[str, float, list[str]]:
+    """
+    Returns a suggested dataset type, its confidence and the language pairs for a
+    dataset from the first rows of its first config.
+
+    Column types are taken from all sample rows, skipping null values. Dictionary keys
+    and column names only count as languages when they match the supported languages;
+    keys that merely look like language codes give a low confidence. Unsupported is
+    only confident when the sample holds audio or image features.
+
+    :param rows: sample rows (dictionaries) of the dataset
+    :param configs: config names of the dataset
+    :param languages: supported languages of the dataset
+    :returns: (dataset type, confidence, language pairs)
+    """
+    pair_configs = [config for config in configs if re.fullmatch(PAIR_PATTERN, config)]
+    if len(pair_configs) > 1:
+        return 'Multilingual Parallel', 0.9, pair_configs
+
+    if not rows:
+        return 'Unsupported', 0.5, []
+
+    values = {}
+    for row in rows:
+        for name, value in row.items():
+            if value is not None:
+                values.setdefault(name, []).append(value)
+
+    keys = set()
+    for column in values.values():
+        if all(isinstance(value, dict) and not is_media(value) and
+               all(text is None or is_text(text) for text in value.values())
+               for value in column):
+            keys.update(key for value in column for key, text in value.items()
+                        if text is not None)
+    keys = sorted(keys)
+    language_keys = [key for key in keys if re.split('[_-]', key.lower())[0] in languages]
+    text_columns = [name for name, column in values.items() if all(map(is_text, column))]
+    language_columns = [name for name in text_columns
+                        if re.split('[_-]', name.lower())[0] in languages]
+
+    if len(language_keys) >= 2:
+        pairs = ["-".join(pair) for pair in itertools.combinations(language_keys, 2)]
+        if len(language_keys) == 2:
+            return 'Parallel', 0.95 if len(languages) == 2 else 0.5, pairs
+        return 'Multilingual Parallel', 0.9, pairs
+
+    if len(keys) >= 2 and all(re.fullmatch(LANGUAGE_PATTERN, key.lower()) for key in keys):
+        pairs = ["-".join(pair) for pair in itertools.combinations(keys, 2)]
+        return 'Parallel' if len(keys) == 2 else 'Multilingual Parallel', 0.5, pairs
+
+    if len(language_columns) >= 2:
+        pairs = ["-".join(pair) for pair in itertools.combinations(language_columns, 2)]
+        if len(language_columns) == 2:
+            return 'Parallel', 0.85 if len(languages) == 2 else 0.5, pairs
+        return 'Multilingual Parallel', 0.8, pairs
+
+    lowered = {name.lower() for name in text_columns}
+    if any(source in lowered and target in lowered for source, target in SOURCE_TARGET):
+        if len(languages) == 2:
+            return 'Parallel', 0.7, ["-".join(languages)]
+        return 'Multilingual Parallel', 0.5, []
+
+    if len(text_columns) == 1:
+        return 'Monolingual', 0.6, []
+
+    media = any(is_media(value) for column in values.values() for value in column)
+    return 'Unsupported', 0.8 if media else 0.4, []
+
+def probe_dataset(identifier, n_rows=20) -> tuple[list[str], list[dict]]:
+    """
+    Returns the config names and the first n_rows of the first config of a dataset.
+
+    The dataset is streamed, so only the head of its first data file is downloaded.
+    Dataset loading scripts are not run; such datasets fail to load and get a
+    zero-confidence suggestion.
+    """
+    configs = get_dataset_config_names(identifier, trust_remote_code=False)
+    streams = load_dataset(identifier, configs[0] if configs else None, streaming=True,
+                           trust_remote_code=False)
+    split = 'train' if 'train' in streams else next(iter(streams))
+    return configs, list(itertools.islice(streams[split], n_rows))
+
+def suggest_tags(dataframe, n_rows=20, max_workers=8, probe=probe_dataset) -> pd.DataFrame:
+    """
+    Returns suggested dataset types for the datasets in dataframe, probing them
+    concurrently.
+
+    :param dataframe: Hugging Face datasets df
+    :param n_rows: rows to stream per dataset
+    :param max_workers: datasets probed at the same time
+    :param probe: function (identifier, n_rows) -> (configs, rows)
+    :returns: suggestions df
+    """
+    def suggest(row):
+        identifier = row['Author/Dataset']
+        try:
+            configs, rows = probe(identifier, n_rows)
+        except Exception as exc: # pylint: disable=broad-except
+            logging.info("Error probing dataset %s: %s", identifier, exc)
+            return [identifier, 'Unsupported', 0.0, []]
+
+        languages = row['Supported Languages']
+        try:
+            languages = ast.literal_eval(languages) if isinstance(languages, str) \
+                        else list(languages)
+        except (ValueError, SyntaxError, TypeError):
+            logging.info("Invalid supported languages for dataset %s: %s", identifier, languages)
+            languages = []
+        return [identifier, *classify_sample(rows, configs, languages)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        data = list(pool.map(suggest, [row for _, row in dataframe.iterrows()]))
+
+    return pd.DataFrame(data, columns=COLS4)
+
+def auto_tag(dataframe, threshold=0.8, probe=probe_dataset, \
+             save_path='references/suggested_tags.csv') -> pd.DataFrame:
+    """
+    Returns the dataframe with untagged datasets tagged when the suggestion is confident.
+
+    All suggestions are saved to save_path for manual review.
+
+    :param dataframe: Hugging Face datasets df
+    :param threshold: minimum confidence for applying a suggested tag
+    :param probe: function (identifier, n_rows) -> (configs, rows)
+    :param save_path: csv file for the suggestions
+    :returns: tagged df
+    """
+    untagged = dataframe[dataframe['Dataset Type'].isna() | (dataframe['Dataset Type'] == '')]
+    if untagged.empty:
+        return dataframe
+
+    suggestions = suggest_tags(untagged, probe=probe)
+    suggestions.to_csv(save_path, header=True, index=False)
+
+    confident = suggestions[suggestions['Confidence'] >= threshold]
+    tags = confident.set_index('Author/Dataset')['Suggested Type']
+    dataframe = dataframe.copy()
+    mask = dataframe['Author/Dataset'].isin(tags.index) & dataframe.index.isin(untagged.index)
+    dataframe.loc[mask, 'Dataset Type'] = dataframe.loc[mask, 'Author/Dataset'].map(tags)
+
+    logging.info("Tagged %d of %d untagged datasets.", len(confident), len(untagged))
+    return dataframe
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Read translation data from Hugging Face.')
     parser.add_argument('scrape', help='Generate files for mt')
@@ -287,6 +452,12 @@ if __name__ == "__main__":
 
         elif args.scrape == 'refresh':
             _ = update_spreadsheet('data/mt_hf.csv', mt_data)
+            mt_df = auto_tag(pd.read_csv('data/mt_hf.csv'))
+            mt_df.to_csv('data/mt_hf.csv', header=True, index=False)
+
+    elif args.scrape == 'update:tag':
+        mt_df = auto_tag(pd.read_csv('data/mt_hf.csv'))
+        mt_df.to_csv('data/mt_hf.csv', header=True, index=False)
 
     elif args.scrape.startswith(('update:create', 'update:monitor')):
         mt_df = pd.read_csv('data/mt_hf.csv')
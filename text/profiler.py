@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+This program profiles parallel corpora (bitext .csv files or Moses file pairs, i.e. the
+outputs of ```to_bitext```/```to_opus```) in a single streaming pass and stores the
+statistics in ```data/corpus_stats.csv``` next to the language pair tables.
+
+- The # train/development/test sets of the language pairs count rows. The profile shows
+how many of those rows are usable sentence pairs (non-empty, non-identical) and whether a
+corpus holds sentences, word lists or multi-sentence rows.
+
+python profiler.py Helsinki-NLP/tatoeba en-es data/tatoeba/bitext.csv
+python profiler.py Helsinki-NLP/kde4 en-es data/kde4/KDE4.en data/kde4/KDE4.es
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import sys
+import logging
+
+import numpy as np
+import pandas as pd
+import xxhash
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(message)s', \
+                    handlers=[logging.StreamHandler(sys.stdout)])
+
+STATS_PATH = 'data/corpus_stats.csv'
+COLS3 = ['Author/Dataset', 'Language Pair', 'Row Type', '# Rows', '# Usable Rows',
+         'Identical Rate', 'Multi-sentence Rate',
+         'Source Empty Rate', 'Source Tokens', 'Source Characters', 'Source Vocabulary',
+         'Source Median Length', 'Source P90 Length', 'Source Length Histogram',
+         'Target Empty Rate', 'Target Tokens', 'Target Characters', 'Target Vocabulary',
+         'Target Median Length', 'Target P90 Length', 'Target Length Histogram']
+
+# Token length bins: 0, 1, 2-3, 4-7, ..., 512+
+N_BINS = 11
+SENTENCE_BREAK = re.compile(r'[.!?。！？؟।]["\')\]]*\s+\S')
+
+class HyperLogLog:
+    """
+    HyperLogLog cardinality sketch with 2^precision one-byte registers.
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes) -> None:
+        """Add an array of 64-bit hashes."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        # rest < 2^50 is exact as float64, so frexp gives its bit length.
+        rank = (64 - self.precision) - np.frexp(rest.astype(np.float64))[1] + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def count(self) -> int:
+        """Estimated number of distinct hashes."""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size**2 / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * np.log(size / zeros)
+        return int(round(estimate))
+
+class SideProfile:
+    """
+    Streaming statistics for one side of a corpus.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.empty = 0
+        self.tokens = 0
+        self.chars = 0
+        self.histogram = np.zeros(N_BINS, dtype=np.int64)
+        self.vocabulary = HyperLogLog()
+
+    def update(self, texts) -> np.ndarray:
+        """Add a chunk of text and return its token lengths."""
+        split = [text.split() for text in texts]
+        lengths = np.fromiter(map(len, split), dtype=np.int64, count=len(split))
+
+        self.rows += len(texts)
+        self.empty += int(np.count_nonzero(lengths == 0))
+        self.tokens += int(lengths.sum())
+        self.chars += sum(map(len, texts))
+
+        bins = np.minimum(np.frexp(lengths.astype(np.float64))[1], N_BINS - 1)
+        self.histogram += np.bincount(bins, minlength=N_BINS)
+        self.vocabulary.add(np.fromiter(
+            (xxhash.xxh3_64_intdigest(token) for token in itertools.chain.from_iterable(split)),
+            dtype=np.uint64, count=int(lengths.sum())))
+
+        return lengths
+
+    def quantile(self, q) -> int:
+        """Upper bound of the length bin containing quantile q."""
+        if self.rows == 0:
+            return 0
+        position = int(np.searchsorted(np.cumsum(self.histogram), q * self.rows))
+        return 0 if position == 0 else (1 << position) - 1
+
+    def stats(self, prefix) -> dict:
+        """Statistics with column names starting with prefix."""
+        return {
+            f'{prefix} Empty Rate': round(self.empty / max(self.rows, 1), 4),
+            f'{prefix} Tokens': self.tokens,
+            f'{prefix} Characters': self.chars,
+            f'{prefix} Vocabulary': self.vocabulary.count(),
+            f'{prefix} Median Length': self.quantile(0.5),
+            f'{prefix} P90 Length': self.quantile(0.9),
+            f'{prefix} Length Histogram': json.dumps(self.histogram.tolist()),
+        }
+
+def read_pairs(paths, source=None, target=None):
+    """
+    Yields (source, target) pairs from a bitext .csv file or two Moses files.
+
+    :param paths: [bitext.csv] or [source file, target file]
+    :param source: source column of the bitext (defaults to the first column)
+    :param target: target column of the bitext (defaults to the second column)
+    :raises ValueError: if the Moses files have different numbers of lines
+    """
+    if len(paths) == 2:
+        with open(paths[0], 'r', encoding='utf-8-sig') as src, \
+             open(paths[1], 'r', encoding='utf-8-sig') as tgt:
+            for i, (src_line, tgt_line) in enumerate(itertools.zip_longest(src, tgt)):
+                if src_line is None or tgt_line is None:
+                    raise ValueError(f"{paths[0]} and {paths[1]} differ in length "
+                                     f"after {i} lines")
+                yield src_line.rstrip('\r\n'), tgt_line.rstrip('\r\n')
+        return
+
+    with open(paths[0], 'r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        columns = [name for name in header if name not in ('idx', 'orig_index')]
+        src_index = header.index(source or columns[0])
+        tgt_index = header.index(target or columns[1])
+
+        for row in reader:
+            yield row[src_index], row[tgt_index]
+
+def profile_corpus(paths, source=None, target=None, chunk_size=100_000) -> dict:
+    """
+    Profile a corpus in one pass with memory bounded by chunk_size.
+
+    Row Type is 'Word List' when at least 80% of the rows have at most two tokens on
+    both sides, 'Sentences' when at most 20% do and 'Mixed' otherwise.
+
+    :return: statistics keyed by the COLS3 column names
+    """
+    sides = SideProfile(), SideProfile()
+    identical = multi_sentence = usable = short = non_empty = 0
+    pairs = read_pairs(paths, source, target)
+
+    while chunk := list(itertools.islice(pairs, chunk_size)):
+        sources, targets = [pair[0] for pair in chunk], [pair[1] for pair in chunk]
+        src_lengths = sides[0].update(sources)
+        tgt_lengths = sides[1].update(targets)
+
+        same = np.fromiter((s.strip() == t.strip() for s, t in chunk), dtype=bool,
+                           count=len(chunk))
+        both = (src_lengths > 0) & (tgt_lengths > 0)
+        non_empty += int(np.count_nonzero(both))
+        identical += int(np.count_nonzero(same & both))
+        usable += int(np.count_nonzero(both & ~same))
+        short += int(np.count_nonzero((src_lengths <= 2) & (tgt_lengths <= 2)))
+        multi_sentence += sum(1 for s, t in chunk
+                              if SENTENCE_BREAK.search(s) or SENTENCE_BREAK.search(t))
+
+    rows = sides[0].rows
+    short_rate = short / max(rows, 1)
+    row_type = 'Word List' if short_rate >= 0.8 else 'Sentences' if short_rate <= 0.2 \
+               else 'Mixed'
+
+    return {
+        'Row Type': row_type,
+        '# Rows': rows,
+        '# Usable Rows': usable,
+        'Identical Rate': round(identical / max(non_empty, 1), 4),
+        'Multi-sentence Rate': round(multi_sentence / max(rows, 1), 4),
+        **sides[0].stats('Source'),
+        **sides[1].stats('Target'),
+    }
+
+def update_stats(dataset, pair, stats, path=STATS_PATH) -> pd.DataFrame:
+    """
+    Add or replace the statistics of a dataset and language pair in the stats file.
+    """
+    row = pd.DataFrame([{'Author/Dataset': dataset, 'Language Pair': pair, **stats}],
+                       columns=COLS3)
+
+    if os.path.exists(path):
+        old = pd.read_csv(path)
+        old = old[~((old['Author/Dataset'] == dataset) & (old['Language Pair'] == pair))]
+        row = pd.concat([old, row], axis=0)
+
+    row.to_csv(path, header=True, index=False)
+    return row
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile a bitext or Moses file pair.')
+    parser.add_argument('dataset', help='Author/Dataset as in the language pairs')
+    parser.add_argument('pair', help='Language Pair as in the language pairs')
+    parser.add_argument('paths', nargs='+', help='bitext .csv file or source and target files')
+    parser.add_argument('--source', default=None, help='Source column of the bitext')
+    parser.add_argument('--target', default=None, help='Target column of the bitext')
+    args = parser.parse_args()
+
+    corpus_stats = profile_corpus(args.paths, args.source, args.target)
+    update_stats(args.dataset, args.pair, corpus_stats)
+    logging.info("%s (%s): %d usable of %d rows, %s", args.dataset, args.pair,
+                 corpus_stats['# Usable Rows'], corpus_stats['# Rows'], corpus_stats['Row Type'])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+This program performs simple tests for the automatic dataset tagging in
+```get_data.py```.
+"""
+
+import os
+import sys
+
+import pytest
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import get_data # pylint: disable=wrong-import-position
+
+@pytest.mark.parametrize('rows, configs, languages, expected', [
+    ([{'translation': {'en': 'Hi', 'es': 'Hola'}}], ['default'], ['en', 'es'],
+     ('Parallel', 0.95, ['en-es'])),
+    ([{'translation': {'en': 'Hi', 'es': 'Hola', 'fr': 'Salut'}}], ['default'],
+     ['en', 'es', 'fr'], ('Multilingual Parallel', 0.9, ['en-es', 'en-fr', 'es-fr'])),
+    ([], ['en-es', 'en-fr'], ['en', 'es', 'fr'],
+     ('Multilingual Parallel', 0.9, ['en-es', 'en-fr'])),
+    ([{'id': 1, 'eng_Latn': 'Hi', 'quy_Latn': 'Napaykullayki'}], ['default'], ['eng', 'quy'],
+     ('Parallel', 0.85, ['eng_Latn-quy_Latn'])),
+    ([{'source': 'Hi', 'target': 'Hola'}], ['default'], ['en', 'es'],
+     ('Parallel', 0.7, ['en-es'])),
+    ([{'text': 'Hola'}], ['default'], ['es'], ('Monolingual', 0.6, [])),
+    ([{'audio': {'array': [0.1]}, 'label': 1}], ['default'], ['es'], ('Unsupported', 0.8, [])),
+    ([{'translation': {'en': 'Hi', 'es': None}}, {'translation': {'en': 'Bye', 'es': 'Adiós'}}],
+     ['default'], ['en', 'es'], ('Parallel', 0.95, ['en-es'])),
+    ([{'translation': {'en': ['Hi', '!'], 'es': ['Hola', '!']}}], ['default'], ['en', 'es'],
+     ('Parallel', 0.95, ['en-es'])),
+    ([{'en': ['Hi', '!'], 'es': ['Hola', '!']}], ['default'], ['en', 'es'],
+     ('Parallel', 0.85, ['en-es'])),
+    ([{'text': None, 'id': 1}, {'text': 'Hola', 'id': 2}], ['default'], ['es'],
+     ('Monolingual', 0.6, [])),
+    ([{'id': 1, 'label': 0}], ['default'], ['es'], ('Unsupported', 0.4, [])),
+    ([{'text': 'Hola amigos', 'meta': {'url': 'http://x', 'title': 'y'}}], ['default'],
+     ['en', 'es'], ('Monolingual', 0.6, [])),
+    ([{'translation': {'de': 'Hallo', 'fr': 'Salut'}}], ['default'], ['en', 'es'],
+     ('Parallel', 0.5, ['de-fr'])),
+])
+def test_classify_sample(rows, configs, languages, expected) -> None:
+    """Dataset types from sample rows and configs"""
+    assert get_data.classify_sample(rows, configs, languages) == expected
+
+def test_auto_tag(tmp_path) -> None:
+    """Only untagged datasets with confident suggestions are tagged"""
+    dataframe = pd.DataFrame({
+        'Author/Dataset': ['a/parallel', 'a/mono', 'a/tagged', 'a/broken', 'a/nolang'],
+        'Dataset Type': [None, None, 'Unsupported', None, None],
+        'Supported Languages': ["['en', 'es']", "['es']", "['en', 'es']", "['en', 'es']",
+                                float('nan')],
+        })
+    samples = {'a/parallel': [{'translation': {'en': 'Hi', 'es': 'Hola'}}],
+               'a/mono': [{'text': 'Hola'}],
+               'a/nolang': [{'translation': {'en': 'Hi', 'es': 'Hola'}}]}
+    probed = []
+
+    def probe(identifier, n_rows):
+        probed.append(identifier)
+        return ['default'], samples[identifier][:n_rows]
+
+    save_path = str(tmp_path / 'suggested_tags.csv')
+    tagged = get_data.auto_tag(dataframe, probe=probe, save_path=save_path)
+
+    assert sorted(probed) == ['a/broken', 'a/mono', 'a/nolang', 'a/parallel']
+    assert tagged['Dataset Type'].tolist()[:3] == ['Parallel', None, 'Unsupported']
+    assert tagged['Dataset Type'].isna().tolist()[3:] == [True, True]
+    suggestions = pd.read_csv(save_path)
+    assert suggestions['Suggested Type'].tolist() == \
+        ['Parallel', 'Monolingual', 'Unsupported', 'Parallel']
+    assert suggestions['Confidence'].tolist()[3] == 0.5
@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+This program performs simple tests for the preprocessing steps in
+```experiments/preprocessing.py```.
+
+The experiments need torch, transformers, ftfy and sentencepiece, which are not part of
+requirements.txt; the tests are skipped when they are not installed.
+"""
+
+import os
+import sys
+
+import pytest
+import numpy as np
+import pandas as pd
+import yaml
+import pyarrow as pa
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('transformers')
+pytest.importorskip('ftfy')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'experiments'))
+import preprocessing # pylint: disable=wrong-import-position
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch) -> tuple[str, str]:
+    """Write a moses source file and a filter_by_langid target file"""
+    monkeypatch.chdir(tmp_path)
+    src_dir = tmp_path / 'corpus' / 'eng-spa'
+    src_dir.mkdir(parents=True)
+    source_path = src_dir.relative_to(tmp_path) / 'source.txt'
+    source_path.write_text('Hello world\nA "quoted"\tline\nDropped\nLast one', encoding='utf-8')
+
+    target = pd.DataFrame({'target': ['Hola mundo', 'Una "línea"\tcitada', 'El último'],
+                           'orig_index': [0, 1, 3]})
+    target_path = source_path.with_name('target.tsv')
+    target.to_csv(target_path, sep='\t', header=False, index=False, encoding='utf-8-sig')
+
+    return str(source_path), str(target_path)
+
+def test_line_index(corpus: tuple[str, str]) -> None:
+    """Line lookups through the offset index"""
+    with preprocessing.LineIndex(corpus[0]) as lines:
+        assert len(lines) == 4
+        assert lines[1] == 'A "quoted"\tline'.encode('utf-8')
+        assert lines[3] == b'Last one'
+
+def test_to_bitext_roundtrip(corpus: tuple[str, str]) -> None:
+    """Streaming bitext conversion keeps tabs and quotes intact"""
+    cleaner = preprocessing.IdiomataDataCleaning(None, 'English', 'Spanish', None)
+    cleaner.to_bitext(*corpus)
+
+    bitext_path = os.path.join(os.path.dirname(corpus[0]), 'bitext.csv')
+    bitext = pd.read_csv(bitext_path)
+    assert bitext['English'].tolist() == ['Hello world', 'A "quoted"\tline', 'Last one']
+    assert bitext['Spanish'].tolist() == ['Hola mundo', 'Una "línea"\tcitada', 'El último']
+
+    cleaner.to_opus(bitext_path)
+    with open(bitext_path[:-4] + '.spa', 'r', encoding='utf-8') as file:
+        assert file.read().splitlines() == bitext['Spanish'].tolist()
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_fix_encoding(tmp_path, workers: int) -> None:
+    """Encoding repair on repeated lines of a bitext without orig_index"""
+    bitext_path = str(tmp_path / 'bitext.csv')
+    pd.DataFrame({'English': ['Nice', 'Schon &amp; gut', 'Nice', 'Schon &amp; gut'],
+                  'German': ['SchÃ¶n', 'Schön', 'SchÃ¶n', 'ok']}).to_csv(
+                  bitext_path, header=True, index=False, encoding='utf-8-sig')
+
+    cleaner = preprocessing.IdiomataDataCleaning(None, 'English', 'German', None)
+    cleaner.fix_encoding(bitext_path, workers=workers, chunk_size=2)
+
+    bitext = pd.read_csv(bitext_path)
+    assert bitext.columns.tolist() == ['English', 'German']
+    assert bitext['English'].tolist() == ['Nice', 'Schon & gut', 'Nice', 'Schon & gut']
+    assert bitext['German'].tolist() == ['Schön', 'Schön', 'Schön', 'ok']
+
+@pytest.mark.parametrize('cache_size, repairs', [(100, 3), (1, 6)])
+def test_fix_encoding_cache(tmp_path, monkeypatch, cache_size: int, repairs: int) -> None:
+    """Repairs are memoized in a bounded cache"""
+    bitext_path = str(tmp_path / 'bitext.csv')
+    pd.DataFrame({'English': ['Schon &amp; gut', 'Schon &amp; gut', 'Schon &amp; gut'],
+                  'German': ['SchÃ¶n', 'Schön', 'SchÃ¶n']}).to_csv(
+                  bitext_path, header=True, index=False, encoding='utf-8-sig')
+    fixed = []
+    fix_texts = preprocessing._fix_texts # pylint: disable=protected-access
+
+    def counting_fix_texts(texts):
+        fixed.extend(texts)
+        return fix_texts(texts)
+
+    monkeypatch.setattr(preprocessing, '_fix_texts', counting_fix_texts)
+    cleaner = preprocessing.IdiomataDataCleaning(None, 'English', 'German', None)
+    cleaner.fix_encoding(bitext_path, workers=1, chunk_size=1, cache_size=cache_size)
+
+    bitext = pd.read_csv(bitext_path)
+    assert bitext['English'].tolist() == ['Schon & gut'] * 3
+    assert bitext['German'].tolist() == ['Schön'] * 3
+    assert len(fixed) == repairs
+
+def test_length_filters(tmp_path) -> None:
+    """Length and length-ratio filters in a single pass with drop counts"""
+    bitext_path = str(tmp_path / 'bitext.csv')
+    pd.DataFrame({'English': ['a b c', '', 'one two three four five six seven', 'x y'],
+                  'Spanish': ['a b c', 'vacío', 'uno', 'x y z w v u t s r q p']}).to_csv(
+                  bitext_path, header=True, index=False)
+
+    cleaner = preprocessing.IdiomataDataCleaning(None, 'English', 'Spanish', None)
+    cleaner.filter_by_wordlength(min_length=1, max_length=10)
+    cleaner.filter_by_alignmentlength(max_ratio=3.0)
+    counts = cleaner.apply_filters(bitext_path, chunk_size=3)
+
+    assert counts == {'wordlength': 2, 'alignmentlength': 1, 'total': 3}
+    assert pd.read_csv(bitext_path)['English'].tolist() == ['a b c']
+
+def test_alignment_cascade(tmp_path) -> None:
+    """Alignment only encodes rows kept by the cheaper filters"""
+    bitext_path = str(tmp_path / 'bitext.csv')
+    pd.DataFrame({'English': ['a b c', '', 'one two three four five six seven'],
+                  'Spanish': ['x y z', 'vacío', 'uno']}).to_csv(
+                  bitext_path, header=True, index=False)
+    encoded = []
+
+    def encoder(texts):
+        encoded.extend(texts)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    cleaner = preprocessing.IdiomataDataCleaning(None, 'English', 'Spanish', None)
+    cleaner.filter_by_alignment(encoder, str(tmp_path / 'cache'))
+    cleaner.filter_by_wordlength(min_length=1)
+    cleaner.filter_by_alignmentlength(max_ratio=3.0)
+
+    assert cleaner.apply_filters(bitext_path) == \
+        {'alignment': 0, 'wordlength': 1, 'alignmentlength': 1, 'total': 2}
+    assert sorted(encoded) == ['a b c', 'x y z']
+
+@pytest.fixture
+def tiny_encoder(tmp_path) -> str:
+    """Save a tiny randomly initialized BERT model as a local LaBSE stand-in"""
+    from transformers import BertConfig, BertModel, BertTokenizer # pylint: disable=import-outside-toplevel
+
+    model_path = tmp_path / 'tiny-labse'
+    model_path.mkdir()
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', 'hello', 'world', 'hola', 'mundo']
+    (model_path / 'vocab.txt').write_text('\n'.join(vocab), encoding='utf-8')
+
+    BertTokenizer(str(model_path / 'vocab.txt')).save_pretrained(model_path)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=16, num_hidden_layers=1,
+                        num_attention_heads=2, intermediate_size=32)
+    BertModel(config).save_pretrained(model_path)
+
+    return str(model_path)
+
+def test_alignment_scores(tmp_path, tiny_encoder: str) -> None:
+    """Alignment scores with a memory-mapped embedding cache"""
+    encoder = preprocessing.LaBSEEncoder(tiny_encoder)
+    calls = []
+
+    def counting_encoder(texts):
+        calls.append(len(texts))
+        return encoder(texts)
+
+    sources = ['hello world', 'hello', 'hello world']
+    targets = ['hola mundo', 'hello', 'hola']
+    scorer = preprocessing.AlignmentScorer(counting_encoder, str(tmp_path / 'cache'), batch_size=2,
+                                           encoder_name=tiny_encoder)
+    scores = scorer.score(sources, targets)
+
+    assert scores.shape == (3,)
+    assert scores[1] == pytest.approx(1.0, abs=1e-3)
+    assert sum(calls) == 4
+
+    reopened = preprocessing.AlignmentScorer(encoder, str(tmp_path / 'cache'))
+    assert reopened.score(sources, targets) == pytest.approx(scores, abs=1e-6)
+    assert sum(calls) == 4
+    assert reopened.cache.lookup([preprocessing.EmbeddingCache.key('hola'), 0])[1] == -1
+
+    with pytest.raises(ValueError, match='caches embeddings of encoder'):
+        preprocessing.AlignmentScorer(counting_encoder, str(tmp_path / 'cache'),
+                                      encoder_name='other-model')
+
+def test_embedding_cache_index(tmp_path) -> None:
+    """Recently added keys are merged into the sorted key index"""
+    cache = preprocessing.EmbeddingCache(str(tmp_path / 'cache'), 'model')
+    keys = np.arange(1 << 16, dtype=np.uint64)[::-1] * 3
+    cache.add(keys, np.zeros((len(keys), 2), dtype=np.float32))
+    cache.add([1], np.ones((1, 2), dtype=np.float32))
+
+    assert len(cache) == len(keys) + 1
+    assert cache.lookup([keys[0], keys[-1], 1, 2]).tolist() == [0, len(keys) - 1, len(keys), -1]
+    assert preprocessing.EmbeddingCache(str(tmp_path / 'cache'), 'model').lookup([1]).tolist() == \
+        [len(keys)]
+
+def test_hash_set() -> None:
+    """Membership across merged runs"""
+    hashes = preprocessing.HashSet()
+    for start in range(0, 100, 10):
+        hashes.add(range(start, start + 10, 2))
+
+    assert len(hashes) == 50
+    assert hashes.contains([0, 1, 98, 99, 1000]).tolist() == [True, False, True, False, False]
+
+def test_hash_set_save(tmp_path) -> None:
+    """Save and load round trip, including an empty set"""
+    path = str(tmp_path / 'hashes.npy')
+    preprocessing.HashSet().save(path)
+    assert preprocessing.HashSet(path).contains([1]).tolist() == [False]
+
+    hashes = preprocessing.HashSet()
+    hashes.add([5, 3])
+    hashes.add([2**64 - 1])
+    hashes.save(path)
+    assert preprocessing.HashSet(path).contains([3, 4, 5, 2**64 - 1]).tolist() == \
+        [True, False, True, True]
+
+def test_deduplicate(tmp_path) -> None:
+    """Exact and near duplicates within and across sources"""
+    first = str(tmp_path / 'first.csv')
+    second = str(tmp_path / 'second.csv')
+    pd.DataFrame({'English': ['Good morning', 'good  MORNING', 'The cat sat on the mat today',
+                              'Something else entirely'],
+                  'Spanish': ['Buenos días', 'Buenos días', 'El gato se sentó en la alfombra hoy',
+                              'Otra cosa']}).to_csv(first, header=True, index=False)
+    pd.DataFrame({'English': ['The cat sat on the mat today!', 'Good morning', 'New line'],
+                  'Spanish': ['El gato se sentó en la alfombra hoy!', 'Buenos días',
+                              'Nueva línea']}).to_csv(second, header=True, index=False)
+
+    cleaner = preprocessing.IdiomataDataCleaning(None, 'English', 'Spanish', None)
+    rates = cleaner.deduplicate([first, second], keep_index=True, chunk_size=2)
+
+    assert rates['# Duplicates'].tolist() == [1, 1]
+    assert rates['# Near Duplicates'].tolist() == [0, 1]
+    assert pd.read_csv(first)['orig_index'].tolist() == [0, 2, 3]
+    assert pd.read_csv(second)['English'].tolist() == ['New line']
+
+def test_deduplicate_across_runs(tmp_path) -> None:
+    """Hashes saved by one run remove duplicates in a later run"""
+    first = str(tmp_path / 'first.csv')
+    second = str(tmp_path / 'second.csv')
+    pd.DataFrame({'English': ['Good morning', 'The cat sat on the mat today'],
+                  'Spanish': ['Buenos días', 'El gato se sentó en la alfombra hoy']}).to_csv(
+                  first, header=True, index=False)
+    pd.DataFrame({'English': ['good  MORNING', 'The cat sat on the mat today!', 'New line'],
+                  'Spanish': ['Buenos días', 'El gato se sentó en la alfombra hoy!',
+                              'Nueva línea']}).to_csv(second, header=True, index=False)
+    hashes_path = str(tmp_path / 'hashes')
+
+    cleaner = preprocessing.IdiomataDataCleaning(None, 'English', 'Spanish', None)
+    cleaner.deduplicate([first], hashes_path=hashes_path)
+    rates = cleaner.deduplicate([second], hashes_path=hashes_path)
+
+    assert rates['# Duplicates'].tolist() == [1]
+    assert rates['# Near Duplicates'].tolist() == [1]
+    assert pd.read_csv(second)['English'].tolist() == ['New line']
+    assert sorted(os.listdir(hashes_path)) == ['buckets-64-8-3-0.npy', 'pairs.npy']
+
+def test_orig_index_is_kept(tmp_path) -> None:
+    """orig_index written by deduplicate survives filtering and a second deduplication"""
+    bitext_path = str(tmp_path / 'bitext.csv')
+    pd.DataFrame({'English': ['Hello', 'Hello', 'a b c d e f g', 'Bye'],
+                  'Spanish': ['Hola', 'Hola', 'a', 'Adiós']}).to_csv(
+                  bitext_path, header=True, index=False)
+
+    cleaner = preprocessing.IdiomataDataCleaning(None, 'English', 'Spanish', None)
+    cleaner.deduplicate([bitext_path], near_duplicates=False, keep_index=True)
+    cleaner.filter_by_alignmentlength(max_ratio=3.0)
+    cleaner.apply_filters(bitext_path)
+    cleaner.deduplicate([bitext_path], near_duplicates=False, keep_index=True)
+
+    assert pd.read_csv(bitext_path)['orig_index'].tolist() == [0, 3]
+
+@pytest.fixture
+def backtranslation(tmp_path) -> preprocessing.BackTranslation:
+    """Back-translation with a tiny randomly initialized Marian model"""
+    import json # pylint: disable=import-outside-toplevel
+    spm = pytest.importorskip('sentencepiece')
+    from transformers import MarianConfig, MarianMTModel, MarianTokenizer # pylint: disable=import-outside-toplevel
+
+    lines = ['hola mundo', 'buenos días', 'el gato se sentó en la alfombra', 'sí', 'hola']
+    corpus = tmp_path / 'mono.tsv'
+    corpus.write_text(''.join(f'{line}\t{i}\n' for i, line in enumerate(lines * 4)),
+                      encoding='utf-8')
+
+    spm.SentencePieceTrainer.train(input=str(corpus), model_prefix=str(tmp_path / 'spm'),
+                                   vocab_size=40, model_type='char', minloglevel=2)
+    with open(tmp_path / 'spm.vocab', 'r', encoding='utf-8') as file:
+        pieces = [line.split('\t')[0] for line in file]
+    tokens = ['</s>', '<unk>', '<pad>'] + [p for p in pieces if p not in ('<unk>', '<s>', '</s>')]
+    with open(tmp_path / 'vocab.json', 'w', encoding='utf-8') as file:
+        json.dump({token: i for i, token in enumerate(tokens)}, file)
+
+    model_path = str(tmp_path / 'tiny-marian')
+    MarianTokenizer(str(tmp_path / 'spm.model'), str(tmp_path / 'spm.model'),
+                    str(tmp_path / 'vocab.json'), model_max_length=16).save_pretrained(model_path)
+    config = MarianConfig(vocab_size=len(tokens), d_model=16, encoder_layers=1, decoder_layers=1,
+                          encoder_attention_heads=2, decoder_attention_heads=2,
+                          encoder_ffn_dim=32, decoder_ffn_dim=32, max_position_embeddings=64,
+                          pad_token_id=2, eos_token_id=0, decoder_start_token_id=2,
+                          forced_eos_token_id=0, init_std=1.0)
+    torch.manual_seed(0)
+    MarianMTModel(config).save_pretrained(model_path)
+
+    return preprocessing.BackTranslation(preprocessing.Translator(model_path, ''), str(corpus),
+                                         preprocessing.Pair('English', 'Spanish'))
+
+def test_token_batches() -> None:
+    """Token-budget batches cover every row once"""
+    lengths = np.array([5, 1, 9, 3, 3, 20])
+    batches = preprocessing.token_batches(lengths, max_tokens=10)
+
+    assert sorted(np.concatenate(batches).tolist()) == list(range(6))
+    assert all(lengths[b].max() * len(b) <= 10 or len(b) == 1 for b in batches)
+
+def test_translate_token_budget(backtranslation: preprocessing.BackTranslation) -> None:
+    """Bucketed translation keeps the original order"""
+    batch = backtranslation.dataset[:10]
+    bucketed = backtranslation.translate(batch, max_tokens=40)
+    single = [backtranslation.translate({'Spanish': [text]})['English'][0]
+              for text in batch['Spanish']]
+
+    assert bucketed['Spanish'] == batch['Spanish']
+    assert bucketed['English'] == single
+
+def test_translation_cache(tmp_path, backtranslation: preprocessing.BackTranslation) -> None:
+    """Only new unique sentences reach generate"""
+    backtranslation.cache = preprocessing.TranslationCache(str(tmp_path / 'cache.db'), 'tiny')
+    generated = []
+    generate = backtranslation._generate # pylint: disable=protected-access
+
+    def counting_generate(input_ids):
+        generated.extend(input_ids)
+        return generate(input_ids)
+
+    backtranslation._generate = counting_generate # pylint: disable=protected-access
+    batch = backtranslation.dataset[:10]
+    first = backtranslation.translate(batch, max_tokens=40)
+    assert len(generated) == 5
+
+    second = backtranslation.translate({'Spanish': batch['Spanish'] + ['hola  mundo', 'nuevo']})
+    assert second['English'][:10] == first['English']
+    assert second['English'][10] == first['English'][0]
+    assert len(generated) == 6
+
+def test_translation_cache_eviction(tmp_path) -> None:
+    """Least recently used translations are evicted"""
+    cache = preprocessing.TranslationCache(str(tmp_path / 'cache.db'), 'tiny', max_entries=2)
+    cache.put(['a', 'b'], ['A', 'B'])
+    assert cache.get(['a']) == ['A']
+
+    cache.put(['c'], ['C'])
+    assert len(cache) == 2
+    assert cache.get(['a', 'b', 'c']) == ['A', None, 'C']
+
+    cache.put(['a', 'c'], ['A2', 'C'])
+    assert cache._count == len(cache) == 2 # pylint: disable=protected-access
+    assert cache.get(['a', 'c']) == ['A2', 'C']
+    assert cache.get(['c']) == ['C']
+
+    cache.put(['d', 'd'], ['D', 'D'])
+    assert cache._count == len(cache) == 2 # pylint: disable=protected-access
+    assert cache.get(['a', 'c', 'd']) == [None, 'C', 'D']
+
+def test_optimize_for_cpu(tmp_path, backtranslation: preprocessing.BackTranslation) -> None:
+    """Dynamic int8 quantization with a separate cache namespace"""
+    backtranslation.cache = preprocessing.TranslationCache(
+        str(tmp_path / 'cache.db'), backtranslation._namespace()) # pylint: disable=protected-access
+    fp32 = backtranslation.cache.namespace
+
+    backtranslation.optimize_for_cpu(threads=1)
+    assert any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear)
+               for module in backtranslation.translator.modules())
+    assert backtranslation.cache.namespace != fp32
+    assert len(backtranslation.translate(backtranslation.dataset[:4])['English']) == 4
+
+def test_optimize_for_cpu_interop_warning(monkeypatch, caplog,
+                                          backtranslation: preprocessing.BackTranslation) -> None:
+    """A fixed inter-op thread count is reported instead of silently ignored"""
+    def set_num_interop_threads(_):
+        raise RuntimeError('cannot set number of interop threads after parallel work has started')
+
+    monkeypatch.setattr(torch, 'set_num_interop_threads', set_num_interop_threads)
+    backtranslation.optimize_for_cpu(quantize=False, interop_threads=3, warmup=False)
+    assert 'Ignoring interop_threads=3' in caplog.text
+
+def test_translate_checkpointed(tmp_path, backtranslation: preprocessing.BackTranslation) -> None:
+    """Interrupted runs resume from the manifest and compact in order"""
+    save_path = str(tmp_path / 'bitext.csv')
+    backtranslation.translate_monolingual(save_path, batch_size=3, checkpoint_rows=8)
+    single = pd.read_csv(save_path, keep_default_na=False)
+    assert single.columns.tolist() == ['Spanish', 'idx', 'English']
+    assert single['idx'].tolist() == list(range(20))
+
+    writer = preprocessing.CheckpointWriter(save_path + '.parts')
+    assert sorted(writer.completed()) == [(0, 8), (8, 16), (16, 20)]
+
+    os.remove(writer.completed()[(8, 16)])
+    with open(writer.manifest_path, 'a', encoding='utf-8') as file:
+        file.write('{"start": 16, "en')
+    calls = []
+    translate = backtranslation.translate
+
+    def counting_translate(batch, max_tokens=None):
+        calls.append(len(batch['Spanish']))
+        return translate(batch, max_tokens=max_tokens)
+
+    backtranslation.translate = counting_translate
+
+    backtranslation.translate_monolingual(save_path, batch_size=3, checkpoint_rows=8)
+    assert calls == [3, 3, 2]
+    assert pd.read_csv(save_path, keep_default_na=False).equals(single)
+
+def test_translate_resume_layout(tmp_path,
+                                 backtranslation: preprocessing.BackTranslation) -> None:
+    """Resuming with another checkpoint_rows skips covered rows and compacts without overlaps"""
+    save_path = str(tmp_path / 'bitext.csv')
+    backtranslation.translate_monolingual(save_path, batch_size=8, checkpoint_rows=8)
+    single = pd.read_csv(save_path, keep_default_na=False)
+
+    writer = preprocessing.CheckpointWriter(save_path + '.parts')
+    os.remove(writer.completed()[(8, 16)])
+    calls = []
+    translate = backtranslation.translate
+
+    def counting_translate(batch, max_tokens=None):
+        calls.append(len(batch['Spanish']))
+        return translate(batch, max_tokens=max_tokens)
+
+    backtranslation.translate = counting_translate
+    backtranslation.translate_monolingual(save_path, batch_size=8, checkpoint_rows=5)
+    assert calls == [5, 3]
+    assert sorted(writer.completed()) == [(0, 8), (8, 13), (13, 16), (16, 20)]
+    assert pd.read_csv(save_path, keep_default_na=False).equals(single)
+
+    writer.write(2, 18, pa.Table.from_pandas(single.iloc[2:18].assign(English='overlap'),
+                                             preserve_index=False))
+    assert writer.compact(save_path, total=20) == 20
+    compacted = pd.read_csv(save_path, keep_default_na=False)
+    assert compacted['idx'].tolist() == list(range(20))
+    assert compacted['English'].tolist() == (single['English'].tolist()[:8] + ['overlap'] * 10 +
+                                             single['English'].tolist()[18:])
+
+    os.remove(writer.completed()[(16, 20)])
+    with pytest.raises(ValueError, match=r'Missing rows \[18, 20\)'):
+        writer.compact(save_path, total=20)
+
+def test_translate_sharded(tmp_path, backtranslation: preprocessing.BackTranslation) -> None:
+    """Sharded translation restores the original order and skips finished shards"""
+    single_path = str(tmp_path / 'single.csv')
+    backtranslation.translate_monolingual(single_path)
+    single = pd.read_csv(single_path, keep_default_na=False)
+
+    sharded_path = str(tmp_path / 'sharded.csv')
+    writer = preprocessing.CheckpointWriter(sharded_path + '.parts')
+    writer.write(0, 5, pa.Table.from_pandas(single.iloc[:5].assign(English='done'),
+                                            preserve_index=False))
+    backtranslation.translate_monolingual(sharded_path, workers=2, shards=4, threads=1)
+    sharded = pd.read_csv(sharded_path, keep_default_na=False)
+
+    assert sharded['idx'].tolist() == single['idx'].tolist()
+    assert sharded['English'].tolist() == ['done'] * 5 + single['English'].tolist()[5:]
+
+def test_noise_augmenter() -> None:
+    """Seeded dropout, swaps and replacements are reproducible"""
+    texts = ['the cat sat on the mat', 'a dog', '', 'one']
+    augmenter = preprocessing.NoiseAugmenter(seed=1)
+    augmenter.dropout, augmenter.swap, augmenter.replacement = 0.3, 0.3, 1.0
+    augmenter.synonyms = {'cat': ['kitten'], 'dog': ['hound', 'puppy']}
+
+    noisy = augmenter.apply(texts)
+    assert noisy == augmenter.apply(texts)
+    assert noisy == list(augmenter.augment(iter(texts), batch_size=4))
+    assert 'cat' not in ' '.join(noisy) and 'dog' not in ' '.join(noisy)
+    assert noisy[2] == '' and noisy[3] == 'one'
+    assert all(len(n.split()) >= 1 for n in noisy[:2])
+
+    texts = [f'sentence {i} with a few more words and a cat' for i in range(8)] + texts
+    noisy = augmenter.apply(texts)
+    assert noisy == augmenter.apply(texts[:4]) + augmenter.apply(texts[4:])
+    assert noisy == list(augmenter.augment(iter(texts), batch_size=3))
+    repeated = augmenter.apply(['x y z w v u t s'] * 2)
+    assert repeated[0] == augmenter.apply(['x y z w v u t s'])[0] != repeated[1]
+
+    augmenter.dropout, augmenter.replacement = 0.0, 0.0
+    augmenter.swap = 1.0
+    assert augmenter.apply(['a b c d e']) == ['b a d c e']
+
+def test_huggingface_push(tmp_path) -> None:
+    """Sharded export to a local hub only re-uploads changed shards"""
+    paths = {}
+    for name, rows in [('Tatoeba', 400), ('KDE4', 3)]:
+        paths[name] = str(tmp_path / f'{name}.csv')
+        pd.DataFrame({'English': [f'sentence {i}' for i in range(rows)],
+                      'Spanish': [f'oración "{i}", 1' for i in range(rows)]}).to_csv(
+                      paths[name], header=True, index=False, encoding='utf-8-sig')
+
+    hub = preprocessing.LocalHub(str(tmp_path / 'hub'), git=True)
+    (tmp_path / 'hub' / 'README.md').write_text(
+        '---\nlicense: cc-by-4.0\n---\n# Idiomata\n\nHand-written notes.\n', encoding='utf-8')
+    first = preprocessing.huggingface_push(paths, hub=hub, max_shard_size=1024)
+    shards = sorted(path for path in hub.files() if path.startswith('Tatoeba/'))
+
+    assert len(shards) > 1
+    assert first['configs']['Tatoeba']['train']['num_examples'] == 400
+    assert pd.concat(pd.read_parquet(tmp_path / 'hub' / shard) for shard in shards)[
+        'Spanish'].tolist() == [f'oración "{i}", 1' for i in range(400)]
+    with open(tmp_path / 'hub' / 'README.md', 'r', encoding='utf-8') as file:
+        _, header, body = file.read().split('---\n')
+    card = yaml.safe_load(header)
+    assert card['license'] == 'cc-by-4.0'
+    assert card['dataset_info'][1]['splits'][0]['num_examples'] == 3
+    assert body == '# Idiomata\n\nHand-written notes.\n'
+
+    assert not preprocessing.huggingface_push(paths, hub=hub, max_shard_size=1024)['uploaded']
+
+    pd.DataFrame({'English': ['changed'], 'Spanish': ['cambiado']}).to_csv(
+        paths['KDE4'], header=True, index=False)
+    assert preprocessing.huggingface_push(paths, hub=hub, max_shard_size=1024)['uploaded'] == \
+        ['KDE4/train-00000.parquet', 'README.md']
+
+def test_huggingface_push_multiline(tmp_path) -> None:
+    """Quoted newlines are kept when rows span CSV blocks"""
+    bitext_path = str(tmp_path / 'bitext.csv')
+    texts = [f'line {i}\nsecond part {i}' for i in range(5000)]
+    pd.DataFrame({'English': texts, 'Spanish': texts}).to_csv(
+        bitext_path, header=True, index=False)
+
+    hub = preprocessing.LocalHub(str(tmp_path / 'hub'))
+    pushed = preprocessing.huggingface_push({'Multiline': bitext_path}, hub=hub,
+                                            max_shard_size=2048)
+    shards = sorted(path for path in hub.files() if path.startswith('Multiline/'))
+
+    assert pushed['configs']['Multiline']['train']['num_examples'] == 5000
+    assert pd.concat(pd.read_parquet(tmp_path / 'hub' / shard) for shard in shards)[
+        'English'].tolist() == texts
+
+def test_huggingface_push_streams_shards(tmp_path) -> None:
+    """Each shard is uploaded and removed before the next one is written"""
+    bitext_path = str(tmp_path / 'bitext.csv')
+    pd.DataFrame({'English': [f'sentence {i}' for i in range(400)],
+                  'Spanish': [f'oración {i}' for i in range(400)]}).to_csv(
+                  bitext_path, header=True, index=False)
+    staging_dir = tmp_path / 'staging'
+    staging_dir.mkdir()
+    staged = []
+
+    class CountingHub(preprocessing.LocalHub):
+        """Local hub recording the shards in staging at each upload"""
+        def upload(self, local_path, path_in_repo) -> None:
+            staged.append(len(list(staging_dir.rglob('*.parquet'))))
+            super().upload(local_path, path_in_repo)
+
+    hub = CountingHub(str(tmp_path / 'hub'))
+    pushed = preprocessing.huggingface_push({'Tatoeba': bitext_path}, hub=hub,
+                                            max_shard_size=1024, staging_dir=str(staging_dir))
+
+    assert len(staged) > 2
+    assert max(staged) == 1
+    assert pushed['configs']['Tatoeba']['train']['num_examples'] == 400
+
+def test_hf_hub_single_commit(tmp_path) -> None:
+    """Uploads and deletions on the Hub are pushed as one commit"""
+    calls = []
+
+    class FakeApi:
+        """Records the Hub API calls"""
+        def preupload_lfs_files(self, repo_id, additions, repo_type):
+            calls.append(('preupload', repo_id, [addition.path_in_repo for addition in additions]))
+
+        def create_commit(self, repo_id, operations, commit_message, repo_type):
+            calls.append(('commit', repo_id, [operation.path_in_repo for operation in operations]))
+
+    hub = preprocessing.HfHub.__new__(preprocessing.HfHub)
+    hub.repo_id, hub.api, hub.operations = 'a/b', FakeApi(), []
+    (tmp_path / 'README.md').write_text('card', encoding='utf-8')
+
+    hub.upload(str(tmp_path / 'README.md'), 'README.md')
+    hub.delete('old/train-00000.parquet')
+    hub.commit('Update')
+    hub.commit('Nothing to do')
+
+    assert calls == [('preupload', 'a/b', ['README.md']),
+                     ('commit', 'a/b', ['README.md', 'old/train-00000.parquet'])]
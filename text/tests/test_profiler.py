@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+This program performs simple tests for the corpus statistics generated by
+```profiler.py```.
+"""
+
+import os
+import sys
+
+import pytest
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import profiler # pylint: disable=wrong-import-position
+
+def test_hyperloglog() -> None:
+    """Approximate vocabulary size within a few percent"""
+    sketch = profiler.HyperLogLog()
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, np.iinfo(np.uint64).max, size=50_000, dtype=np.uint64)
+    sketch.add(np.concatenate([values, values[:10_000]]))
+
+    assert abs(sketch.count() - 50_000) / 50_000 < 0.03
+
+def test_profile_bitext_and_moses(tmp_path) -> None:
+    """Bitext and Moses files give the same profile"""
+    source = ['Hello there. How are you?', 'Good morning', '', 'Same', 'cat']
+    target = ['Hola. ¿Cómo estás?', 'Buenos días', 'Vacío', 'Same', 'gato']
+
+    bitext = tmp_path / 'bitext.csv'
+    pd.DataFrame({'English': source, 'Spanish': target}).to_csv(
+        bitext, header=True, index=False, encoding='utf-8-sig')
+    (tmp_path / 'bitext.eng').write_text('\n'.join(source) + '\n', encoding='utf-8')
+    (tmp_path / 'bitext.spa').write_text('\n'.join(target) + '\n', encoding='utf-8')
+
+    stats = profiler.profile_corpus([str(bitext)], chunk_size=2)
+    moses = profiler.profile_corpus([str(tmp_path / 'bitext.eng'), str(tmp_path / 'bitext.spa')])
+    assert stats == moses
+
+    assert stats['# Rows'] == 5
+    assert stats['# Usable Rows'] == 3
+    assert stats['Identical Rate'] == 0.25
+    assert stats['Multi-sentence Rate'] == 0.2
+    assert stats['Source Empty Rate'] == 0.2
+    assert stats['Source Tokens'] == 9
+    assert stats['Row Type'] == 'Word List'
+
+    (tmp_path / 'bitext.spa').write_text('\n'.join(target[:4]) + '\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='after 4 lines'):
+        profiler.profile_corpus([str(tmp_path / 'bitext.eng'), str(tmp_path / 'bitext.spa')])
+
+def test_update_stats(tmp_path) -> None:
+    """Stats are replaced per dataset and language pair"""
+    path = str(tmp_path / 'corpus_stats.csv')
+    profiler.update_stats('a/b', 'en-es', {'# Rows': 1}, path=path)
+    profiler.update_stats('a/c', 'en-es', {'# Rows': 2}, path=path)
+    stats = profiler.update_stats('a/b', 'en-es', {'# Rows': 3}, path=path)
+
+    assert stats.columns.tolist() == profiler.COLS3
+    assert sorted(pd.read_csv(path)['# Rows'].tolist()) == [2, 3]